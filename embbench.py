@@ -0,0 +1,99 @@
+import argparse
+import os
+import pathlib
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import pymupdf
+
+from embwalk import SAVE_MODES, embed_into_pdf, format_size
+
+
+def make_source_pdf(path, size_mb):
+    # Pages carrying incompressible image data until the file reaches size_mb
+    doc = pymupdf.open()
+    chunk = 4 * 1024 * 1024
+    pixmap_side = int((chunk / 3) ** 0.5)
+    for i in range(max(1, size_mb * 1024 * 1024 // chunk)):
+        page = doc.new_page()
+        samples = os.urandom(pixmap_side * pixmap_side * 3)
+        pix = pymupdf.Pixmap(pymupdf.csRGB, pixmap_side, pixmap_side, samples, False)
+        page.insert_image(page.rect, pixmap=pix)
+        page.insert_text((72, 72), f"Source page {i + 1}")
+    doc.save(path)
+
+
+def make_attachments(directory, count, size_kb):
+    # Half random, half repetitive content so deflate has something to do
+    files = []
+    for i in range(count):
+        file_path = pathlib.Path(directory) / f"attachment_{i}.bin"
+        half = size_kb * 512
+        file_path.write_bytes(os.urandom(half) + bytes(range(256)) * (half // 256))
+        files.append((file_path, file_path.name))
+    return files
+
+
+def read_io_counters():
+    # Bytes written by this process, from /proc where available
+    try:
+        with open("/proc/self/io") as f:
+            fields = dict(line.split(": ") for line in f.read().splitlines())
+        return int(fields["wchar"])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def run_mode(pdf_path, output_path, files, save_mode, memory_limit):
+    # Runs in a fresh process so the I/O counters only cover this mode
+    written_before = read_io_counters()
+    start_time = time.perf_counter()
+    embedded_count, failures = embed_into_pdf(pdf_path, output_path, files, memory_limit, save_mode=save_mode)
+    elapsed = time.perf_counter() - start_time
+    written_after = read_io_counters()
+    return {
+        "seconds": elapsed,
+        "written_bytes": written_after - written_before if written_before is not None else None,
+        "output_bytes": os.path.getsize(output_path),
+        "embedded": embedded_count,
+        "failed": len(failures),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare embwalk save modes")
+    parser.add_argument("pdf", nargs="?", help="Source PDF (a synthetic one is generated if omitted)")
+    parser.add_argument("--source-mb", type=int, default=200, help="Size of the synthetic source PDF")
+    parser.add_argument("--files", type=int, default=20, help="Number of attachments")
+    parser.add_argument("--file-kb", type=int, default=512, help="Size of each attachment")
+    parser.add_argument("--memory-limit-mb", type=int, default=2048)
+    parser.add_argument("--modes", nargs="+", choices=SAVE_MODES, default=list(SAVE_MODES))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        pdf_path = args.pdf
+        if pdf_path is None:
+            pdf_path = os.path.join(workdir, "source.pdf")
+            make_source_pdf(pdf_path, args.source_mb)
+        files = make_attachments(workdir, args.files, args.file_kb)
+
+        print(f"Source {format_size(os.path.getsize(pdf_path))}, "
+              f"{len(files)} attachments of {format_size(args.file_kb * 1024)}")
+        # For incremental saves most of "written" is the copy of the source, which
+        # copy_file_range/reflinks can make nearly free depending on the filesystem
+        source_bytes = os.path.getsize(pdf_path)
+        print(f"{'mode':>12} {'seconds':>9} {'written':>12} {'output':>12} {'vs source':>12}")
+        for save_mode in args.modes:
+            output_path = os.path.join(workdir, f"out_{save_mode}.pdf")
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                result = executor.submit(run_mode, pdf_path, output_path, files, save_mode,
+                                         args.memory_limit_mb * 1024 * 1024).result()
+            written = format_size(result["written_bytes"]) if result["written_bytes"] is not None else "n/a"
+            growth = result['output_bytes'] - source_bytes
+            print(f"{save_mode:>12} {result['seconds']:>9.2f} {written:>12} {format_size(result['output_bytes']):>12} "
+                  f"{'-' if growth < 0 else '+'}{format_size(abs(growth)):>11}")
+            os.remove(output_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,752 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import pymupdf
+import fnmatch
+import hashlib
+import io
+import multiprocessing
+import os
 import pathlib
+import queue
+import re
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from typing import List, Tuple
 
+# Default ceiling for attachment data held in memory before it is written out
+DEFAULT_MEMORY_LIMIT = 2048 * 1024 * 1024
+
+# How the output is written: full rewrite, append-only update onto a copy
+# of the source, or a rewrite with garbage collection and deflated streams
+SAVE_MODES = ('full', 'incremental', 'compact')
+
+# Read size for content hashing, large files are never held in memory whole
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Optional image re-encoding before embedding, results are cached per content hash
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.svg')
+BMP_FORMATS = ('png', 'webp')
+TRANSFORM_CACHE_DIR = pathlib.Path.home() / '.cache' / 'embwalk' / 'images'
+TRANSFORM_CACHE_VERSION = 2  # bump when encode_image output changes, older cache entries are then ignored
+
+# Tokens of a PDF object as printed by xref_get_key, once string contents are removed
+PDF_TOKEN = re.compile(r"<<|>>|\[|\]|\d+\s+\d+\s+R|/[^\s/<>\[\]()]*|\(\)|<[^<>]*>|[^\s/<>\[\]()]+")
+CHECKSUM_PATTERN = re.compile(r"/CheckSum\s*(<[^>]*>|\((?:\\.|[^\\()])*\))", re.S)
+
+CHECKED_MARK = '\u2611'
+UNCHECKED_MARK = '\u2610'
+
+
+def format_size(size: float) -> str:
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def estimate_embed(pdf_path, files: List[Tuple[pathlib.Path, str]], memory_limit: int = DEFAULT_MEMORY_LIMIT) -> dict:
+    """Pre-flight estimate for embedding files into a PDF.
+
+    The output size is an upper bound since attachments are deflated. A file
+    being embedded is briefly held twice (in Python and in MuPDF), so files
+    over half the memory limit are embedded on their own and take the peak
+    memory past the limit.
+    """
+    sizes = []
+    missing = 0
+    for file_path, embed_name in files:
+        try:
+            sizes.append(os.path.getsize(file_path))
+        except OSError:
+            missing += 1  # fails on its own in the embed job, the rest still go in
+    largest = max(sizes, default=0)
+    return {
+        'files': len(files),
+        'missing': missing,
+        'total_bytes': sum(sizes),
+        'largest_bytes': largest,
+        'over_limit': sum(1 for size in sizes if 2 * size > memory_limit),
+        'output_bytes': os.path.getsize(pdf_path) + sum(sizes),
+        'peak_memory_bytes': max(min(memory_limit, sum(sizes) + largest), 2 * largest),
+    }
+
+
+def scan_directory(root, extensions, include=(), exclude=(), max_depth=None, cancel_event=None):
+    """Recursively yield files below root with one of the given extensions.
+
+    Uses os.scandir so file types come from the directory entries instead
+    of a stat call per file. include and exclude are glob patterns matched
+    against the path relative to root and against the bare name; excluded
+    directories are not descended into. max_depth 0 scans only root.
+    """
+    def matches(relative, name, patterns):
+        return any(fnmatch.fnmatch(relative, p) or fnmatch.fnmatch(name, p) for p in patterns)
+    
+    stack = [(os.fspath(root), '', 0)]
+    while stack:
+        directory, prefix, depth = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                subdirectories = []
+                for entry in entries:
+                    if cancel_event is not None and cancel_event.is_set():
+                        return
+                    relative = prefix + entry.name
+                    if matches(relative, entry.name, exclude):
+                        continue
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if max_depth is None or depth < max_depth:
+                                subdirectories.append((entry.path, relative + '/', depth + 1))
+                        elif (entry.is_file() and os.path.splitext(entry.name)[1].lower() in extensions
+                              and (not include or matches(relative, entry.name, include))):
+                            yield pathlib.Path(entry.path)
+                    except OSError:
+                        continue
+        except OSError:
+            continue  # unreadable directory
+        
+        # Visit subdirectories in name order
+        stack.extend(sorted(subdirectories, reverse=True))
+
+
+class DirectoryScanner:
+    """Runs scan_directory on a background thread and hands out results in batches."""
+    
+    def __init__(self, root, extensions, include=(), exclude=(), max_depth=None, batch_size=500):
+        self.root = pathlib.Path(root)
+        self.args = (extensions, include, exclude, max_depth)
+        self.batch_size = batch_size
+        self.results = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.done = False
+        self.error = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+    
+    def start(self):
+        self.thread.start()
+    
+    def run(self):
+        batch = []
+        last_flush = time.monotonic()
+        try:
+            for file_path in scan_directory(self.root, *self.args, cancel_event=self.cancel_event):
+                batch.append(file_path)
+                # Hand results over regularly so slow mounts still show progress
+                if len(batch) >= self.batch_size or time.monotonic() - last_flush > 0.2:
+                    self.results.put(batch)
+                    batch = []
+                    last_flush = time.monotonic()
+        except Exception as e:
+            self.error = e
+        if batch:
+            self.results.put(batch)
+        self.done = True
+    
+    def get_batches(self):
+        batches = []
+        try:
+            while True:
+                batches.append(self.results.get_nowait())
+        except queue.Empty:
+            pass
+        return batches
+    
+    def cancel(self):
+        self.cancel_event.set()
+
+
+def split_patterns(text: str) -> List[str]:
+    # Patterns are separated by commas or semicolons
+    return [p.strip() for p in text.replace(';', ',').split(',') if p.strip()]
+
+
+class EmbedCancelled(Exception):
+    pass
+
+
+def hash_file(file_path, chunk_size: int = HASH_CHUNK_SIZE) -> str:
+    # hashlib releases the GIL on large updates, so this runs well in threads
+    digest = hashlib.md5()
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with open(file_path, 'rb') as f:
+        while True:
+            count = f.readinto(buffer)
+            if not count:
+                break
+            digest.update(view[:count])
+    return digest.hexdigest()
+
+
+def find_duplicates(pdf_path, files: List[Tuple[pathlib.Path, str]], max_workers=None,
+                    progress=None, cancel_event=None):
+    """Split files into those worth embedding and content duplicates.
+
+    A file is a duplicate if an earlier file in the list has the same
+    content, or if the PDF already has an attachment with that content.
+    Only files sharing their size with another candidate or an existing
+    attachment are hashed at all. progress(files_hashed, files_to_hash) is
+    called as hashes complete; setting cancel_event raises EmbedCancelled.
+    Returns the files to embed and a list of (file, embed_name, reason).
+    """
+    sizes = {}
+    for file_path, embed_name in files:
+        try:
+            sizes[file_path] = os.path.getsize(file_path)
+        except OSError:
+            pass  # reported when embedding
+    
+    # Existing attachments, by size; their content is only read when a size matches
+    existing_by_size = {}
+    with pymupdf.open(pdf_path) as doc:
+        for attachment in list_attachments(doc):
+            existing_by_size.setdefault(attachment['size'], []).append(attachment)
+        
+        # Counted per entry, so the same path listed twice is caught too
+        size_counts = {}
+        for file_path, embed_name in files:
+            if file_path in sizes:
+                size_counts[sizes[file_path]] = size_counts.get(sizes[file_path], 0) + 1
+        existing_hashes = {}
+        for size, attachments in existing_by_size.items():
+            if size in size_counts:
+                for attachment in attachments:
+                    # A stored checksum is the MD5 of the file, which saves reading it
+                    digest = attachment['checksum'] if len(attachment['checksum']) == 32 else None
+                    if digest is None:
+                        digest = hashlib.md5(read_attachment(doc, attachment)).hexdigest()
+                    existing_hashes.setdefault(digest, attachment['name'])
+    
+    to_hash = [file_path for file_path, size in sizes.items()
+               if size_counts[size] > 1 or size in existing_by_size]
+    hashes = {}
+    if to_hash:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(hash_file, file_path): file_path for file_path in to_hash}
+            try:
+                for files_hashed, future in enumerate(as_completed(futures), 1):
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise EmbedCancelled()
+                    try:
+                        hashes[futures[future]] = future.result()
+                    except OSError:
+                        pass  # unreadable, left for the embed step to report
+                    if progress is not None:
+                        progress(files_hashed, len(to_hash))
+            finally:
+                for future in futures:
+                    future.cancel()
+    
+    unique_files = []
+    skipped = []
+    seen = {}
+    for file_path, embed_name in files:
+        digest = hashes.get(file_path)
+        if digest is None:
+            unique_files.append((file_path, embed_name))
+        elif digest in existing_hashes:
+            skipped.append((file_path, embed_name, f"already attached as {existing_hashes[digest]}"))
+        elif digest in seen:
+            skipped.append((file_path, embed_name, f"same content as {seen[digest]}"))
+        else:
+            seen[digest] = embed_name
+            unique_files.append((file_path, embed_name))
+    return unique_files, skipped
+
+
+def embed_into_pdf(pdf_path, output_path, files: List[Tuple[pathlib.Path, str]],
+                   memory_limit: int = DEFAULT_MEMORY_LIMIT, progress=None,
+                   cancel_event=None, save_mode: str = 'full',
+                   compact_path=None) -> Tuple[int, List[Tuple[pathlib.Path, str]]]:
+    """Embed files into a copy of a PDF without exceeding memory_limit.
+
+    MuPDF keeps new attachments in memory until the document is saved, so
+    once the pending data would pass the limit the document is written to
+    output_path and reopened, and later batches are appended with
+    incremental saves. A file over half the limit can't fit within it, it
+    is embedded on its own between flushes and exceeds the limit only then.
+    
+    save_mode is one of SAVE_MODES. 'incremental' copies the source to
+    output_path and only appends the attachments, which avoids rewriting a
+    large source. 'compact' garbage-collects and deflates the output; when
+    that needs a second rewrite it goes through compact_path, a temporary
+    file next to the output unless the caller passes one to clean up.
+    
+    progress(files_done, bytes_done, current_name) is called as files are
+    processed; setting cancel_event raises EmbedCancelled between files.
+    output_path may be left half-written then, see run_embed_job.
+    Returns the number of embedded files and a list of (file, error).
+    """
+    if os.path.abspath(pdf_path) == os.path.abspath(output_path):
+        raise ValueError("Output file must differ from the source PDF")
+    if save_mode not in SAVE_MODES:
+        raise ValueError(f"Unknown save mode: {save_mode}")
+    
+    if save_mode == 'incremental':
+        # Appending to a copy leaves the source bytes untouched
+        shutil.copyfile(pdf_path, output_path)
+        doc = pymupdf.open(output_path)
+        if not doc.can_save_incrementally():
+            doc.close()
+            raise ValueError("This PDF can't be saved incrementally, use another save mode")
+        written = True
+    else:
+        doc = pymupdf.open(pdf_path)
+        written = False
+    flushes = 0
+    pending_bytes = 0
+    embedded_count = 0
+    failures = []
+    
+    def flush(doc):
+        nonlocal written, flushes
+        if written:
+            doc.saveIncr()
+        elif save_mode == 'compact':
+            doc.save(output_path, garbage=3, deflate=True)
+            written = True
+        else:
+            doc.save(output_path)
+            written = True
+        doc.close()
+        flushes += 1
+    
+    try:
+        bytes_done = 0
+        for files_done, (file_path, embed_name) in enumerate(files):
+            if cancel_event is not None and cancel_event.is_set():
+                raise EmbedCancelled()
+            if progress is not None:
+                progress(files_done, bytes_done, embed_name)
+            try:
+                size = os.path.getsize(file_path)
+                
+                # The file is held twice while MuPDF copies it, on top of what is pending
+                if pending_bytes and pending_bytes + 2 * size > memory_limit:
+                    flush(doc)
+                    doc = pymupdf.open(output_path)
+                    pending_bytes = 0
+                
+                # Only one file is ever held in Python memory, dropped right after MuPDF copies it
+                data = pathlib.Path(file_path).read_bytes()
+                doc.embfile_add(embed_name, data)
+                del data
+                pending_bytes += size
+                bytes_done += size
+                embedded_count += 1
+            except Exception as e:
+                failures.append((file_path, str(e)))
+        
+        if progress is not None:
+            progress(len(files), bytes_done, "saving")
+        flush(doc)
+        
+        if save_mode == 'compact' and flushes > 1:
+            # Batches after the first were appended, rewrite once to compact them too
+            if compact_path is None:
+                fd, compact_path = tempfile.mkstemp(suffix='.compact',
+                                                    dir=os.path.dirname(os.path.abspath(output_path)))
+                os.close(fd)
+            try:
+                with pymupdf.open(output_path) as compact_doc:
+                    compact_doc.save(compact_path, garbage=3, deflate=True)
+                os.replace(compact_path, output_path)
+            except BaseException:
+                remove_file(compact_path)
+                raise
+    finally:
+        if not doc.is_closed:
+            doc.close()
+    
+    return embedded_count, failures
+
+
+def transform_target(extension: str, options: dict):
+    # Extension an image is re-encoded to, or None when it is embedded as-is
+    if extension == '.bmp':
+        return '.' + options.get('bmp_format', 'png')
+    if extension == '.png':
+        return '.png'
+    if extension in ('.jpg', '.jpeg'):
+        return extension if options.get('jpeg_quality') or options.get('max_dimension') else None
+    if extension == '.svg':
+        return '.png' if options.get('rasterize_svg') else None
+    return None
+
+
+def encode_image(file_path, extension: str, target: str, options: dict) -> bytes:
+    from PIL import Image, ImageOps  # only needed for this optional stage
+    
+    max_dimension = options.get('max_dimension')
+    if extension == '.svg':
+        with pymupdf.open(file_path) as doc:
+            page = doc[0]
+            zoom = max_dimension / max(page.rect.width, page.rect.height) if max_dimension else 1
+            pix = page.get_pixmap(matrix=pymupdf.Matrix(zoom, zoom), alpha=True)
+            image = Image.frombuffer("RGBA", (pix.width, pix.height), pix.samples_mv, "raw", "RGBA", 0, 1).copy()
+    else:
+        image = Image.open(file_path)
+        image.load()
+        # Rotate by the EXIF orientation, which is then dropped so viewers don't rotate twice
+        image = ImageOps.exif_transpose(image)
+    if max_dimension and max(image.size) > max_dimension:
+        image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+    
+    # Keep the colour profile and remaining EXIF data, they are lost unless passed to save
+    metadata = {}
+    if image.info.get('icc_profile'):
+        metadata['icc_profile'] = image.info['icc_profile']
+    exif = image.getexif()
+    if exif:
+        metadata['exif'] = exif
+    
+    buffer = io.BytesIO()
+    if target in ('.jpg', '.jpeg'):
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        image.save(buffer, 'JPEG', quality=options.get('jpeg_quality') or 90, optimize=True, **metadata)
+    elif target == '.webp':
+        image.save(buffer, 'WEBP', lossless=True, **metadata)
+    else:
+        image.save(buffer, 'PNG', optimize=True, **metadata)
+    return buffer.getvalue()
+
+
+def transform_image(file_path, embed_name: str, options: dict, cache_dir=TRANSFORM_CACHE_DIR) -> dict:
+    """Re-encode one image for embedding, runs in a worker process.
+
+    options holds bmp_format, jpeg_quality, max_dimension and rasterize_svg.
+    A re-encoded image is only used if it is smaller, except for rasterized
+    SVGs. Results are cached under cache_dir by content hash and options,
+    including the decision to keep the original, so re-runs skip the work.
+    Returns a dict with the path and embed name to use and the byte counts.
+    """
+    start_time = time.perf_counter()
+    file_path = pathlib.Path(file_path)
+    result = {'path': file_path, 'name': embed_name, 'original_bytes': 0, 'bytes': 0,
+              'transformed': False, 'seconds': 0.0, 'cached': False, 'error': None}
+    try:
+        result['original_bytes'] = result['bytes'] = os.path.getsize(file_path)
+        extension = file_path.suffix.lower()
+        target = transform_target(extension, options)
+        if target is None:
+            return result
+        
+        key_source = f"{TRANSFORM_CACHE_VERSION}:{hash_file(file_path)}:{sorted(options.items())}"
+        key = hashlib.md5(key_source.encode()).hexdigest()
+        cache_path = pathlib.Path(cache_dir) / f"{key}{target}"
+        keep_path = pathlib.Path(cache_dir) / f"{key}.keep"
+        if keep_path.exists():
+            result['cached'] = True
+            return result
+        if cache_path.exists():
+            result['cached'] = True
+        else:
+            data = encode_image(file_path, extension, target, options)
+            os.makedirs(cache_dir, exist_ok=True)
+            if len(data) >= result['original_bytes'] and extension != '.svg':
+                keep_path.touch()
+                return result
+            # Write under a temporary name so a concurrent reader never sees half a file
+            temp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, cache_path)
+        
+        result['path'] = cache_path
+        result['bytes'] = os.path.getsize(cache_path)
+        result['transformed'] = True
+        if target != extension:
+            result['name'] = str(pathlib.PurePosixPath(embed_name).with_suffix(target))
+    except Exception as e:
+        result['error'] = str(e)  # embedded unchanged
+    finally:
+        result['seconds'] = time.perf_counter() - start_time
+    return result
+
+
+def transform_images(files: List[Tuple[pathlib.Path, str]], options: dict, cache_dir=TRANSFORM_CACHE_DIR,
+                     max_workers=None):
+    """Run transform_image over the images in files in a process pool.
+
+    max_workers 0 runs in this process, for callers that are pool workers
+    themselves. Returns the files to embed, in order, and the results.
+    """
+    indexes = [i for i, (file_path, embed_name) in enumerate(files)
+               if pathlib.Path(file_path).suffix.lower() in IMAGE_EXTENSIONS]
+    if max_workers == 0:
+        results = [transform_image(*files[i], options, cache_dir) for i in indexes]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(transform_image, *files[i], options, cache_dir) for i in indexes]
+            results = [future.result() for future in futures]
+    files = list(files)
+    for i, result in zip(indexes, results):
+        files[i] = (result['path'], result['name'])
+    return files, results
+
+
+def summarize_transforms(results: List[dict]) -> str:
+    changed = sum(1 for r in results if r['transformed'])
+    saved = sum(r['original_bytes'] - r['bytes'] for r in results)
+    cached = sum(1 for r in results if r['cached'])
+    failed = sum(1 for r in results if r['error'])
+    summary = (f"Images: {changed} of {len(results)} re-encoded, {format_size(abs(saved))} "
+               f"{'saved' if saved >= 0 else 'added'}, {sum(r['seconds'] for r in results):.1f}s worker time, "
+               f"{cached} from cache")
+    if failed:
+        summary += f", {failed} failed and embedded unchanged"
+    return summary
+
+
+def run_embed_job(pdf_path, output_path, temp_path, files, memory_limit, save_mode, messages, cancel_event,
+                  skip_duplicates=False, compact_path=None):
+    """Worker process entry point for the GUI.
+
+    With skip_duplicates, files are first checked with find_duplicates and
+    the remaining totals are reported in a 'planned' message. Writes to
+    temp_path next to the output and only renames it into place once
+    everything succeeded, so a cancelled or failed job leaves no
+    half-written output. compact_path is the scratch file for 'compact'
+    saves, removed here like temp_path. Reports back through the messages
+    queue.
+    """
+    def progress(files_done, bytes_done, current_name):
+        messages.put(('progress', files_done, bytes_done, current_name))
+    
+    def hash_progress(files_hashed, files_to_hash):
+        messages.put(('hashing', files_hashed, files_to_hash))
+    
+    try:
+        skipped = []
+        if skip_duplicates:
+            files, skipped = find_duplicates(pdf_path, files, progress=hash_progress, cancel_event=cancel_event)
+            total_bytes = sum(os.path.getsize(f) for f, embed_name in files if os.path.exists(f))
+            messages.put(('planned', len(files), total_bytes))
+        embedded_count, failures = embed_into_pdf(pdf_path, temp_path, files, memory_limit,
+                                                  progress, cancel_event, save_mode, compact_path)
+        if cancel_event.is_set():
+            raise EmbedCancelled()
+        publish_file(temp_path, output_path)
+        messages.put(('done', embedded_count, [(str(f), error) for f, error in failures],
+                      [(str(f), embed_name, reason) for f, embed_name, reason in skipped]))
+    except EmbedCancelled:
+        remove_file(temp_path)
+        messages.put(('cancelled',))
+    except Exception as e:
+        remove_file(temp_path)
+        messages.put(('error', str(e)))
+    finally:
+        if compact_path is not None:
+            remove_file(compact_path)  # already renamed away if it was used
+
+
+def remove_file(file_path):
+    try:
+        os.remove(file_path)
+    except OSError:
+        pass
+
+
+def publish_file(temp_path, output_path):
+    # mkstemp files are private (0600); give the output the mode a plainly created file would get
+    umask = os.umask(0)
+    os.umask(umask)
+    os.chmod(temp_path, 0o666 & ~umask)
+    os.replace(temp_path, output_path)
+
+
+def blank_pdf_strings(text: str) -> str:
+    # Drop the contents of literal strings, so nothing inside them looks like syntax
+    parts = []
+    depth = 0
+    escaped = False
+    for c in text:
+        if not depth:
+            parts.append(c)
+            if c == '(':
+                depth = 1
+        elif escaped:
+            escaped = False
+        elif c == '\\':
+            escaped = True
+        elif c == '(':
+            depth += 1
+        elif c == ')':
+            depth -= 1
+            if not depth:
+                parts.append(c)
+    return ''.join(parts)
+
+
+def pdf_string_bytes(token: str) -> bytes:
+    # Raw bytes of a PDF string token, either <hex> or a (literal) with escapes
+    if token.startswith('<'):
+        return bytes.fromhex(re.sub(r'\s', '', token[1:-1]))
+    escapes = {'n': b'\n', 'r': b'\r', 't': b'\t', 'b': b'\b', 'f': b'\f'}
+    data = bytearray()
+    for escape, char in re.findall(r'\\([0-7]{1,3}|.)|([^\\])', token[1:-1], re.S):
+        if char:
+            data += char.encode('latin-1')
+        elif escape[0] in '01234567':
+            data.append(int(escape, 8) & 0xFF)
+        else:
+            data += escapes.get(escape, escape.encode('latin-1'))
+    return bytes(data)
+
+
+def embedded_file_streams(doc) -> List[int]:
+    """Stream xrefs of the embedded files, in embfile_names() order.
+
+    embfile_info looks every item up through embfile_names(), which is
+    quadratic in the number of attachments. This reads the EmbeddedFiles
+    name array once instead. Returns an empty list if it has another shape
+    (a name tree with Kids), see list_attachments.
+    """
+    kind, text = doc.xref_get_key(doc.pdf_catalog(), "Names/EmbeddedFiles/Names")
+    if kind != 'array':
+        return []
+    
+    streams = []
+    depth = 0
+    index = 0  # element of the name array: names at even, file specifications at odd positions
+    keys = []  # last name seen per nesting level, to spot /EF << /F n 0 R >>
+    for token in PDF_TOKEN.findall(blank_pdf_strings(text)):
+        if token in ('[', '<<'):
+            depth += 1
+            keys.append(None)
+        elif token in (']', '>>'):
+            depth -= 1
+            keys.pop()
+            if depth == 1:
+                index += 1
+        elif depth == 1:
+            if token.endswith('R') and index % 2:
+                # File specification stored as its own object
+                kind, value = doc.xref_get_key(int(token.split()[0]), "EF/F")
+                streams.append(int(value.split()[0]) if kind == 'xref' else 0)
+            index += 1
+        elif token.startswith('/'):
+            keys[-1] = token
+        elif token.endswith('R') and depth == 3 and keys[-2:] == ['/EF', '/F']:
+            streams.append(int(token.split()[0]))
+    return streams
+
+
+def list_attachments(doc) -> List[dict]:
+    """Name, size, stored size and checksum of every attachment, without reading any.
+
+    Sizes are -1 where the PDF doesn't record them. 'xref' is the file's
+    stream, 0 when it could not be located (then use embfile_get).
+    """
+    names = doc.embfile_names()
+    streams = embedded_file_streams(doc)
+    if len(streams) != len(names):
+        # Unusual layout, fall back to the slow per-item lookups
+        attachments = []
+        for index, name in enumerate(names):
+            info = doc.embfile_info(index)
+            attachments.append({'name': name, 'size': info['size'], 'length': info['length'],
+                                'checksum': info.get('checksum', ''), 'xref': 0})
+        return attachments
+    
+    def get_int(xref, key):
+        kind, value = doc.xref_get_key(xref, key)
+        return int(value) if kind == 'int' else -1
+    
+    attachments = []
+    for name, xref in zip(names, streams):
+        size = get_int(xref, "Params/Size") if xref else -1
+        if size < 0 and xref:
+            size = get_int(xref, "DL")
+        # The checksum is binary, so it is taken from the raw dictionary rather than as text
+        kind, params = doc.xref_get_key(xref, "Params") if xref else ('null', '')
+        match = CHECKSUM_PATTERN.search(params) if kind == 'dict' else None
+        attachments.append({'name': name, 'size': size, 'length': get_int(xref, "Length") if xref else -1,
+                            'checksum': pdf_string_bytes(match.group(1)).hex() if match else '', 'xref': xref})
+    return attachments
+
+
+def read_attachment(doc, attachment: dict) -> bytes:
+    if attachment['xref']:
+        return doc.xref_stream(attachment['xref'])
+    return doc.embfile_get(attachment['name'])
+
+
+def attachment_output_path(output_dir, name: str) -> pathlib.Path:
+    # Embed names may hold folders, but must not point outside output_dir
+    parts = []
+    for part in re.split(r'[\\/]+', name):
+        # A drive ('C:' or 'C:Windows') would make the path absolute or drive-relative on Windows
+        part = part[len(pathlib.PureWindowsPath(part).drive):]
+        if os.name == 'nt':
+            # Windows drops trailing dots and spaces, so '.. ' is '..' there
+            part = part.rstrip(' .')
+        if part not in ('', '.', '..'):
+            parts.append(part)
+    if not parts:
+        raise ValueError(f"Invalid attachment name: {name!r}")
+    if os.name == 'nt' and any(':' in part for part in parts):
+        # Alternate data stream syntax
+        raise ValueError(f"Invalid attachment name: {name!r}")
+    
+    output_path = pathlib.Path(output_dir).joinpath(*parts)
+    # Symlinked folders inside output_dir could still lead out of it
+    try:
+        output_path.resolve().relative_to(pathlib.Path(output_dir).resolve())
+    except ValueError:
+        raise ValueError(f"Attachment name points outside the output folder: {name!r}") from None
+    return output_path
+
+
+def unique_output_path(output_path: pathlib.Path, used: set) -> pathlib.Path:
+    # Names like 'a/b' and 'a\\b' map to the same file, later ones get a numbered name
+    candidate = output_path
+    number = 2
+    while os.path.normcase(candidate).casefold() in used:
+        candidate = output_path.with_name(f"{output_path.stem} ({number}){output_path.suffix}")
+        number += 1
+    used.add(os.path.normcase(candidate).casefold())
+    return candidate
+
+
+def run_extract_job(pdf_path, output_dir, attachments, messages, cancel_event):
+    """Worker process entry point for extracting attachments.
+
+    attachments are entries from list_attachments. Only one file is held
+    in memory at a time. Reports through the messages queue like
+    run_embed_job.
+    """
+    try:
+        failures = []
+        bytes_done = 0
+        used_paths = set()
+        with pymupdf.open(pdf_path) as doc:
+            for files_done, attachment in enumerate(attachments):
+                if cancel_event.is_set():
+                    messages.put(('cancelled', files_done))
+                    return
+                messages.put(('progress', files_done, bytes_done, attachment['name']))
+                try:
+                    output_path = unique_output_path(attachment_output_path(output_dir, attachment['name']), used_paths)
+                    data = read_attachment(doc, attachment)
+                    output_path.parent.mkdir(parents=True, exist_ok=True)
+                    with open(output_path, 'wb') as f:
+                        f.write(data)
+                    bytes_done += len(data)
+                    del data
+                except Exception as e:
+                    failures.append((attachment['name'], str(e)))
+        messages.put(('done', len(attachments) - len(failures), bytes_done, failures))
+    except Exception as e:
+        messages.put(('error', str(e)))
+
+
 class PDFEmbedderGUI:
     def __init__(self, root):
         self.root = root
@@ -17,8 +760,22 @@ class PDFEmbedderGUI:
         self.pdf_file = tk.StringVar()
         self.working_dir = tk.StringVar()
         self.output_file = tk.StringVar()
-        self.files_to_embed = []  # List of (file_path, embed_name) tuples
+        self.include_patterns = tk.StringVar()
+        self.exclude_patterns = tk.StringVar()
+        self.max_depth = tk.StringVar()
+        self.memory_limit_mb = tk.StringVar(value=str(DEFAULT_MEMORY_LIMIT // (1024 * 1024)))
+        self.save_mode = tk.StringVar(value='full')
+        self.skip_duplicates = tk.BooleanVar(value=True)
+        self.recompress_images = tk.BooleanVar(value=False)
+        self.bmp_format = tk.StringVar(value='png')
+        self.jpeg_quality = tk.StringVar()
+        self.max_dimension = tk.StringVar()
+        self.rasterize_svg = tk.BooleanVar(value=False)
+        self.files_to_embed = {}  # Treeview iid -> (file_path, embed_name), in display order
+        self.next_file_id = 0
         self.doc = None
+        self.job = None  # running embed job: process, messages, cancel event and totals
+        self.transform = None  # running image re-encoding stage before the embed job
         
         self.create_widgets()
         
@@ -42,8 +799,16 @@ class PDFEmbedderGUI:
         ttk.Entry(main_frame, textvariable=self.working_dir, width=50).grid(row=1, column=1, sticky=(tk.W, tk.E), padx=5)
         ttk.Button(main_frame, text="Browse", command=self.browse_directory).grid(row=1, column=2, padx=5)
         
-        # Load Files Button
-        ttk.Button(main_frame, text="Load Files from Directory", command=self.load_files).grid(row=2, column=0, columnspan=3, pady=10)
+        # Scan filters and Load Files Button
+        scan_frame = ttk.Frame(main_frame)
+        scan_frame.grid(row=2, column=0, columnspan=3, pady=10)
+        ttk.Label(scan_frame, text="Include:").pack(side=tk.LEFT)
+        ttk.Entry(scan_frame, textvariable=self.include_patterns, width=15).pack(side=tk.LEFT, padx=(5, 10))
+        ttk.Label(scan_frame, text="Exclude:").pack(side=tk.LEFT)
+        ttk.Entry(scan_frame, textvariable=self.exclude_patterns, width=15).pack(side=tk.LEFT, padx=(5, 10))
+        ttk.Label(scan_frame, text="Max Depth:").pack(side=tk.LEFT)
+        ttk.Entry(scan_frame, textvariable=self.max_depth, width=4).pack(side=tk.LEFT, padx=(5, 10))
+        ttk.Button(scan_frame, text="Load Files from Directory", command=self.load_files).pack(side=tk.LEFT, padx=5)
         
         # Files List Frame
         files_frame = ttk.LabelFrame(main_frame, text="Files to Embed", padding="5")
@@ -79,12 +844,44 @@ class PDFEmbedderGUI:
         ttk.Entry(main_frame, textvariable=self.output_file, width=50).grid(row=4, column=1, sticky=(tk.W, tk.E), padx=5)
         ttk.Button(main_frame, text="Browse", command=self.browse_output).grid(row=4, column=2, padx=5)
         
-        # Embed Files Button
-        ttk.Button(main_frame, text="Embed Files to PDF", command=self.embed_files, style='Accent.TButton').grid(row=5, column=0, columnspan=3, pady=20)
+        # Memory limit for attachment data held before writing
+        ttk.Label(main_frame, text="Memory Limit (MB):").grid(row=5, column=0, sticky=tk.W, pady=5)
+        options_frame = ttk.Frame(main_frame)
+        options_frame.grid(row=5, column=1, columnspan=2, sticky=tk.W)
+        ttk.Entry(options_frame, textvariable=self.memory_limit_mb, width=10).pack(side=tk.LEFT, padx=5)
+        
+        # Save mode
+        ttk.Label(options_frame, text="Save Mode:").pack(side=tk.LEFT, padx=(20, 5))
+        ttk.Combobox(options_frame, textvariable=self.save_mode, values=SAVE_MODES,
+                     state="readonly", width=12).pack(side=tk.LEFT)
+        ttk.Checkbutton(options_frame, text="Skip duplicates", variable=self.skip_duplicates).pack(side=tk.LEFT, padx=(20, 0))
+        
+        # Optional image re-encoding before embedding
+        ttk.Label(main_frame, text="Images:").grid(row=6, column=0, sticky=tk.W, pady=5)
+        images_frame = ttk.Frame(main_frame)
+        images_frame.grid(row=6, column=1, columnspan=2, sticky=tk.W)
+        ttk.Checkbutton(images_frame, text="Recompress", variable=self.recompress_images).pack(side=tk.LEFT, padx=5)
+        ttk.Label(images_frame, text="BMP as:").pack(side=tk.LEFT, padx=(10, 5))
+        ttk.Combobox(images_frame, textvariable=self.bmp_format, values=BMP_FORMATS,
+                     state="readonly", width=6).pack(side=tk.LEFT)
+        ttk.Label(images_frame, text="JPEG Quality:").pack(side=tk.LEFT, padx=(10, 5))
+        ttk.Entry(images_frame, textvariable=self.jpeg_quality, width=4).pack(side=tk.LEFT)
+        ttk.Label(images_frame, text="Max Size (px):").pack(side=tk.LEFT, padx=(10, 5))
+        ttk.Entry(images_frame, textvariable=self.max_dimension, width=6).pack(side=tk.LEFT)
+        ttk.Checkbutton(images_frame, text="Rasterize SVG", variable=self.rasterize_svg).pack(side=tk.LEFT, padx=(10, 0))
+        
+        # Embed Files and Cancel Buttons
+        embed_frame = ttk.Frame(main_frame)
+        embed_frame.grid(row=7, column=0, columnspan=3, pady=20)
+        self.embed_button = ttk.Button(embed_frame, text="Embed Files to PDF", command=self.embed_files, style='Accent.TButton')
+        self.embed_button.pack(side=tk.LEFT, padx=5)
+        self.cancel_button = ttk.Button(embed_frame, text="Cancel", command=self.cancel_embed, state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.LEFT, padx=5)
+        ttk.Button(embed_frame, text="Show Attachments", command=self.show_attachments_dialog).pack(side=tk.LEFT, padx=5)
         
         # Status Label
         self.status_label = ttk.Label(main_frame, text="Ready", foreground="green")
-        self.status_label.grid(row=6, column=0, columnspan=3, pady=5)
+        self.status_label.grid(row=8, column=0, columnspan=3, pady=5)
         
         # Configure grid weights for main frame
         main_frame.rowconfigure(3, weight=1)
@@ -115,33 +912,38 @@ class PDFEmbedderGUI:
         if not self.working_dir.get():
             messagebox.showerror("Error", "Please select a working directory first.")
             return
+        
+        try:
+            max_depth = int(self.max_depth.get()) if self.max_depth.get().strip() else None
+            if max_depth is not None and max_depth < 0:
+                raise ValueError
+        except ValueError:
+            messagebox.showerror("Error", "Max depth must be empty or a non-negative number.")
+            return
             
         try:
             wlkpath = pathlib.Path(self.working_dir.get())
-            if not wlkpath.exists():
+            if not wlkpath.is_dir():
                 messagebox.showerror("Error", "Working directory does not exist.")
                 return
                 
             # Clear existing files
             self.clear_all()
             
-            # Find all supported files
-            supported_files = []
-            for file_path in wlkpath.iterdir():
-                if file_path.is_file() and file_path.suffix.lower() in self.ftypes:
-                    supported_files.append(file_path)
-            
-            if not supported_files:
-                messagebox.showinfo("Info", f"No supported files found in directory.\nSupported types: {', '.join(self.ftypes)}")
-                return
+            # Scan in the background, files show up in the dialog as they are found
+            scanner = DirectoryScanner(wlkpath, self.ftypes,
+                                       split_patterns(self.include_patterns.get()),
+                                       split_patterns(self.exclude_patterns.get()),
+                                       max_depth)
+            scanner.start()
             
             # Show file selection dialog
-            self.show_file_selection_dialog(supported_files)
+            self.show_file_selection_dialog(scanner)
             
         except Exception as e:
             messagebox.showerror("Error", f"Error loading files: {str(e)}")
             
-    def show_file_selection_dialog(self, files: List[pathlib.Path]):
+    def show_file_selection_dialog(self, scanner: DirectoryScanner):
         # Create a new window for file selection
         dialog = tk.Toplevel(self.root)
         dialog.title("Select Files to Embed")
@@ -149,79 +951,157 @@ class PDFEmbedderGUI:
         dialog.transient(self.root)
         dialog.grab_set()
         
-        # File list with checkboxes
+        # File list
         main_frame = ttk.Frame(dialog, padding="10")
         main_frame.pack(fill=tk.BOTH, expand=True)
         
-        ttk.Label(main_frame, text="Select files to embed:").pack(anchor=tk.W)
+        scan_label = ttk.Label(main_frame, text="Scanning...")
+        scan_label.pack(anchor=tk.W)
         
-        # Create frame for checkboxes with scrollbar
-        canvas = tk.Canvas(main_frame)
-        scrollbar = ttk.Scrollbar(main_frame, orient="vertical", command=canvas.yview)
-        scrollable_frame = ttk.Frame(canvas)
+        # One Treeview row per file, the widget only draws the rows in view.
+        # Selection and embed names live in the model below, keyed by row iid.
+        list_frame = ttk.Frame(main_frame)
+        list_frame.pack(fill=tk.BOTH, expand=True)
+        file_tree = ttk.Treeview(list_frame, columns=('Use', 'File', 'Embed Name'), show='headings')
+        file_tree.heading('Use', text='Use')
+        file_tree.heading('File', text='File')
+        file_tree.heading('Embed Name', text='Embed as (double-click to edit)')
+        file_tree.column('Use', width=40, anchor=tk.CENTER, stretch=False)
+        file_tree.column('File', width=330)
+        file_tree.column('Embed Name', width=280)
+        scrollbar = ttk.Scrollbar(list_frame, orient="vertical", command=file_tree.yview)
+        file_tree.configure(yscrollcommand=scrollbar.set)
+        file_tree.pack(side="left", fill="both", expand=True)
+        scrollbar.pack(side="right", fill="y")
         
-        scrollable_frame.bind(
-            "<Configure>",
-            lambda e: canvas.configure(scrollregion=canvas.bbox("all"))
-        )
+        # Model
+        file_paths = []  # row iid is the index into this list
+        selected = set()
+        embed_names = {}
         
-        canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
-        canvas.configure(yscrollcommand=scrollbar.set)
+        def mark(iid):
+            return CHECKED_MARK if iid in selected else UNCHECKED_MARK
         
-        # Checkbox variables
-        checkbox_vars = {}
-        embed_name_vars = {}
+        def add_files(files: List[pathlib.Path]):
+            for file_path in files:
+                iid = str(len(file_paths))
+                file_paths.append(file_path)
+                # Nested files keep their relative path to stay unique
+                relative_name = file_path.relative_to(scanner.root).as_posix()
+                embed_names[iid] = relative_name
+                selected.add(iid)  # Select all by default
+                file_tree.insert('', 'end', iid=iid, values=(mark(iid), relative_name, relative_name))
         
-        for file_path in files:
-            frame = ttk.Frame(scrollable_frame)
-            frame.pack(fill=tk.X, padx=5, pady=2)
-            
-            var = tk.BooleanVar(value=True)  # Select all by default
-            checkbox_vars[file_path] = var
-            
-            ttk.Checkbutton(frame, variable=var, text=str(file_path.name)).pack(side=tk.LEFT)
-            
-            # Entry for embed name
-            embed_var = tk.StringVar(value=file_path.name)
-            embed_name_vars[file_path] = embed_var
-            ttk.Label(frame, text="Embed as:").pack(side=tk.LEFT, padx=(10, 5))
-            ttk.Entry(frame, textvariable=embed_var, width=30).pack(side=tk.LEFT, padx=5)
+        def set_selected(iids, value):
+            for iid in iids:
+                if value:
+                    selected.add(iid)
+                else:
+                    selected.discard(iid)
+                file_tree.set(iid, 'Use', mark(iid))
         
-        canvas.pack(side="left", fill="both", expand=True)
-        scrollbar.pack(side="right", fill="y")
+        def on_click(event):
+            # Clicking the check column toggles that row
+            if file_tree.identify_region(event.x, event.y) != 'cell' or file_tree.identify_column(event.x) != '#1':
+                return
+            iid = file_tree.identify_row(event.y)
+            if iid:
+                set_selected([iid], iid not in selected)
+        
+        def on_space(event):
+            iids = file_tree.selection()
+            if iids:
+                set_selected(iids, iids[0] not in selected)
+            return "break"
+        
+        # A single entry is moved over whichever cell is being edited
+        edit_entry = ttk.Entry(file_tree)
+        editing = {}
+        
+        def finish_edit(event=None):
+            iid = editing.pop('iid', None)
+            if iid is not None:
+                new_name = edit_entry.get().strip()
+                if new_name:
+                    embed_names[iid] = new_name
+                    file_tree.set(iid, 'Embed Name', new_name)
+            edit_entry.place_forget()
+        
+        def cancel_edit(event=None):
+            editing.pop('iid', None)
+            edit_entry.place_forget()
+        
+        def on_double_click(event):
+            iid = file_tree.identify_row(event.y)
+            if not iid or file_tree.identify_column(event.x) != '#3':
+                return
+            finish_edit()
+            x, y, width, height = file_tree.bbox(iid, 'Embed Name')
+            editing['iid'] = iid
+            edit_entry.delete(0, tk.END)
+            edit_entry.insert(0, embed_names[iid])
+            edit_entry.place(x=x, y=y, width=width, height=height)
+            edit_entry.focus_set()
+            edit_entry.select_range(0, tk.END)
+        
+        edit_entry.bind("<Return>", finish_edit)
+        edit_entry.bind("<FocusOut>", finish_edit)
+        edit_entry.bind("<Escape>", cancel_edit)
+        file_tree.bind("<Button-1>", on_click, add="+")
+        file_tree.bind("<Double-1>", on_double_click)
+        file_tree.bind("<space>", on_space)
+        # The entry is placed in tree coordinates, so it would drift on scroll
+        file_tree.bind("<MouseWheel>", finish_edit, add="+")
+        scrollbar.bind("<Button-1>", finish_edit, add="+")
+        
+        def poll_scanner():
+            if not dialog.winfo_exists():
+                return
+            for batch in scanner.get_batches():
+                add_files(batch)
+            
+            if not scanner.done:
+                scan_label.config(text=f"Scanning... {len(file_paths)} files found")
+                dialog.after(100, poll_scanner)
+            elif scanner.error is not None:
+                scan_label.config(text=f"Scan failed after {len(file_paths)} files: {scanner.error}")
+            elif not file_paths:
+                scan_label.config(text=f"No supported files found. Supported types: {', '.join(self.ftypes)}")
+            else:
+                scan_label.config(text=f"Select files to embed ({len(file_paths)} found):")
         
         # Buttons
         button_frame = ttk.Frame(dialog)
         button_frame.pack(fill=tk.X, padx=10, pady=10)
         
         def select_all():
-            for var in checkbox_vars.values():
-                var.set(True)
+            set_selected(file_tree.get_children(), True)
                 
         def select_none():
-            for var in checkbox_vars.values():
-                var.set(False)
+            set_selected(file_tree.get_children(), False)
+                
+        def close_dialog():
+            scanner.cancel()
+            dialog.destroy()
                 
         def confirm_selection():
-            selected_files = []
-            for file_path, var in checkbox_vars.items():
-                if var.get():
-                    embed_name = embed_name_vars[file_path].get().strip()
-                    if not embed_name:
-                        embed_name = file_path.name
-                    selected_files.append((file_path, embed_name))
+            finish_edit()
+            selected_files = [(file_paths[int(iid)], embed_names[iid] or file_paths[int(iid)].name)
+                              for iid in sorted(selected, key=int)]
             
             if selected_files:
-                self.files_to_embed.extend(selected_files)
-                self.update_files_display()
+                self.add_files(selected_files)
                 self.status_label.config(text=f"Loaded {len(selected_files)} files", foreground="green")
             
-            dialog.destroy()
+            close_dialog()
         
         ttk.Button(button_frame, text="Select All", command=select_all).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="Select None", command=select_none).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="OK", command=confirm_selection).pack(side=tk.RIGHT, padx=5)
-        ttk.Button(button_frame, text="Cancel", command=dialog.destroy).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(button_frame, text="Cancel", command=close_dialog).pack(side=tk.RIGHT, padx=5)
+        dialog.protocol("WM_DELETE_WINDOW", close_dialog)
+        
+        poll_scanner()
         
     def add_single_file(self):
         filename = filedialog.askopenfilename(
@@ -236,8 +1116,7 @@ class PDFEmbedderGUI:
             file_path = pathlib.Path(filename)
             embed_name = tk.simpledialog.askstring("Embed Name", f"Enter embed name for {file_path.name}:", initialvalue=file_path.name)
             if embed_name:
-                self.files_to_embed.append((file_path, embed_name))
-                self.update_files_display()
+                self.add_files([(file_path, embed_name)])
                 self.status_label.config(text=f"Added {file_path.name}", foreground="green")
     
     def remove_selected(self):
@@ -247,10 +1126,9 @@ class PDFEmbedderGUI:
             return
         
         for item in selected_items:
-            index = self.tree.index(item)
-            del self.files_to_embed[index]
+            del self.files_to_embed[item]
+        self.tree.delete(*selected_items)
         
-        self.update_files_display()
         self.status_label.config(text="Selected files removed", foreground="green")
     
     def edit_embed_name(self):
@@ -264,29 +1142,26 @@ class PDFEmbedderGUI:
             return
         
         item = selected_items[0]
-        index = self.tree.index(item)
-        current_embed_name = self.files_to_embed[index][1]
+        file_path, current_embed_name = self.files_to_embed[item]
         
         new_name = tk.simpledialog.askstring("Edit Embed Name", "Enter new embed name:", initialvalue=current_embed_name)
         if new_name:
-            file_path = self.files_to_embed[index][0]
-            self.files_to_embed[index] = (file_path, new_name)
-            self.update_files_display()
+            self.files_to_embed[item] = (file_path, new_name)
+            self.tree.set(item, 'Embed Name', new_name)
             self.status_label.config(text="Embed name updated", foreground="green")
     
     def clear_all(self):
         self.files_to_embed.clear()
-        self.update_files_display()
+        self.tree.delete(*self.tree.get_children())
         self.status_label.config(text="All files cleared", foreground="green")
     
-    def update_files_display(self):
-        # Clear existing items
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        
-        # Add files to display
-        for file_path, embed_name in self.files_to_embed:
-            self.tree.insert('', 'end', values=(str(file_path), embed_name))
+    def add_files(self, files: List[Tuple[pathlib.Path, str]]):
+        # Model and view share the iid, so every change touches only its own rows
+        for file_path, embed_name in files:
+            iid = f"file{self.next_file_id}"
+            self.next_file_id += 1
+            self.files_to_embed[iid] = (file_path, embed_name)
+            self.tree.insert('', 'end', iid=iid, values=(str(file_path), embed_name))
     
     def embed_files(self):
         if not self.pdf_file.get():
@@ -301,38 +1176,363 @@ class PDFEmbedderGUI:
             messagebox.showerror("Error", "No files selected for embedding.")
             return
         
+        if os.path.abspath(self.pdf_file.get()) == os.path.abspath(self.output_file.get()):
+            messagebox.showerror("Error", "Output file must differ from the source PDF.")
+            return
+        
         try:
-            self.status_label.config(text="Embedding files...", foreground="blue")
-            self.root.update()
-            
-            # Open PDF
-            doc = pymupdf.open(self.pdf_file.get())
-            
-            # Embed files
-            embedded_count = 0
-            for file_path, embed_name in self.files_to_embed:
-                try:
-                    embytes = pathlib.Path(file_path).read_bytes()
-                    doc.embfile_add(embed_name, embytes)
-                    embedded_count += 1
-                except Exception as e:
-                    messagebox.showwarning("Warning", f"Failed to embed {file_path.name}: {str(e)}")
-            
-            # Save the document
-            doc.save(self.output_file.get())
-            doc.close()
+            memory_limit = int(float(self.memory_limit_mb.get()) * 1024 * 1024)
+            if memory_limit <= 0:
+                raise ValueError
+        except ValueError:
+            messagebox.showerror("Error", "Please enter a valid memory limit.")
+            return
+        
+        transform_options = None
+        if self.recompress_images.get():
+            try:
+                jpeg_quality = int(self.jpeg_quality.get()) if self.jpeg_quality.get().strip() else None
+                max_dimension = int(self.max_dimension.get()) if self.max_dimension.get().strip() else None
+                if (jpeg_quality is not None and not 1 <= jpeg_quality <= 95) or (max_dimension is not None and max_dimension <= 0):
+                    raise ValueError
+            except ValueError:
+                messagebox.showerror("Error", "JPEG quality must be 1-95 and max size a positive number, or empty.")
+                return
+            transform_options = {'bmp_format': self.bmp_format.get(), 'jpeg_quality': jpeg_quality,
+                                 'max_dimension': max_dimension, 'rasterize_svg': self.rasterize_svg.get()}
+        
+        try:
+            # Pre-flight check before touching the output
+            estimate = estimate_embed(self.pdf_file.get(), list(self.files_to_embed.values()), memory_limit)
+            summary = (f"Files: {estimate['files']} ({format_size(estimate['total_bytes'])})\n"
+                       f"Estimated output size: up to {format_size(estimate['output_bytes'])}\n"
+                       f"Estimated peak memory: {format_size(estimate['peak_memory_bytes'])}")
+            if estimate['over_limit']:
+                summary += (f"\n\n{estimate['over_limit']} file(s) need more than the memory limit "
+                            "(twice their size) and will exceed it while they are embedded.")
+            if estimate['missing']:
+                summary += f"\n\n{estimate['missing']} file(s) can't be read anymore and will fail."
+            if not messagebox.askokcancel("Embed Files", summary):
+                return
             
-            self.status_label.config(text=f"Successfully embedded {embedded_count} files", foreground="green")
-            messagebox.showinfo("Success", f"Successfully embedded {embedded_count} files to {self.output_file.get()}")
+            files = list(self.files_to_embed.values())
+            if transform_options is not None:
+                self.start_transform_stage(files, memory_limit, transform_options)
+            else:
+                self.start_embed_job(files, estimate['total_bytes'], memory_limit)
             
         except Exception as e:
             self.status_label.config(text="Error occurred", foreground="red")
             messagebox.showerror("Error", f"Error embedding files: {str(e)}")
+    
+    def start_transform_stage(self, files, memory_limit, options):
+        # Images are re-encoded in worker processes first, the embed job starts once all are done
+        indexes = [i for i, (file_path, embed_name) in enumerate(files) if file_path.suffix.lower() in IMAGE_EXTENSIONS]
+        executor = ProcessPoolExecutor()
+        stage = self.transform = {'executor': executor, 'files': files, 'indexes': indexes, 'results': {},
+                                  'memory_limit': memory_limit}
+        for i in indexes:
+            future = executor.submit(transform_image, *files[i], options)
+            future.add_done_callback(lambda f, i=i: self.root.after(0, self.on_image_transformed, stage, i, f))
+        
+        self.embed_button.config(state=tk.DISABLED)
+        self.cancel_button.config(state=tk.NORMAL)
+        self.status_label.config(text=f"Re-encoding {len(indexes)} images...", foreground="blue")
+        if not indexes:
+            self.finish_transform_stage()
+    
+    def on_image_transformed(self, stage, index, future):
+        # Results of a cancelled stage can still arrive after a new one started
+        if stage is not self.transform or future.cancelled():
+            return
+        try:
+            stage['results'][index] = future.result()
+        except Exception as e:
+            # The worker itself died, embed this one unchanged
+            file_path, embed_name = stage['files'][index]
+            stage['results'][index] = {'path': file_path, 'name': embed_name, 'original_bytes': 0, 'bytes': 0,
+                                       'transformed': False, 'seconds': 0.0, 'cached': False, 'error': str(e)}
+        self.status_label.config(text=f"Re-encoding images {len(stage['results'])}/{len(stage['indexes'])}",
+                                 foreground="blue")
+        if len(stage['results']) == len(stage['indexes']):
+            self.finish_transform_stage()
+    
+    def finish_transform_stage(self):
+        stage, self.transform = self.transform, None
+        stage['executor'].shutdown(wait=False)
+        files = list(stage['files'])
+        for i, result in stage['results'].items():
+            files[i] = (result['path'], result['name'])
+        
+        memory_limit = stage['memory_limit']
+        # Files that went missing are reported by the embed job, not here
+        total_bytes = sum(os.path.getsize(f) for f, embed_name in files if os.path.exists(f))
+        results = [stage['results'][i] for i in stage['indexes']]
+        self.start_embed_job(files, total_bytes, memory_limit, summarize_transforms(results) if results else None)
+    
+    def start_embed_job(self, files, total_bytes, memory_limit, transform_summary=None):
+        output_path = self.output_file.get()
+        output_dir = os.path.dirname(os.path.abspath(output_path))
+        fd, temp_path = tempfile.mkstemp(suffix='.part', dir=output_dir)
+        os.close(fd)
+        # Created here too, so it can be removed if the process has to be killed
+        fd, compact_path = tempfile.mkstemp(suffix='.compact', dir=output_dir)
+        os.close(fd)
+        
+        # MuPDF holds the GIL while it works, so embedding runs in a separate process
+        messages = multiprocessing.Queue()
+        cancel_event = multiprocessing.Event()
+        process = multiprocessing.Process(
+            target=run_embed_job,
+            args=(self.pdf_file.get(), output_path, temp_path, files,
+                  memory_limit, self.save_mode.get(), messages, cancel_event, self.skip_duplicates.get(),
+                  compact_path),
+            daemon=True)
+        process.start()
+        
+        self.job = {
+            'process': process, 'messages': messages, 'cancel_event': cancel_event,
+            'temp_path': temp_path, 'compact_path': compact_path, 'output_path': output_path,
+            'files_total': len(files),
+            'bytes_total': total_bytes, 'start_time': time.monotonic(), 'cancel_time': None,
+            'transform_summary': transform_summary,
+        }
+        self.embed_button.config(state=tk.DISABLED)
+        self.cancel_button.config(state=tk.NORMAL)
+        self.status_label.config(text="Embedding files...", foreground="blue")
+        self.root.after(100, self.poll_embed_job)
+    
+    def poll_embed_job(self):
+        job = self.job
+        if job is None:
+            return
+        
+        # Only the latest progress message matters, older ones are drained without being shown
+        result = None
+        status = None
+        try:
+            while True:
+                message = job['messages'].get_nowait()
+                if message[0] in ('progress', 'hashing'):
+                    status = message
+                elif message[0] == 'planned':
+                    job['files_total'], job['bytes_total'] = message[1], message[2]
+                else:
+                    result = message
+        except queue.Empty:
+            pass
+        
+        if status is not None and status[0] == 'progress':
+            self.show_embed_progress(*status[1:])
+        elif status is not None:
+            self.status_label.config(text=f"Checking for duplicates, hashed {status[1]}/{status[2]} files",
+                                     foreground="blue")
+        
+        if result is None and not job['process'].is_alive():
+            result = ('error', f"Embedding process exited with code {job['process'].exitcode}")
+        if result is None and job['cancel_time'] is not None and time.monotonic() - job['cancel_time'] > 2:
+            # Stuck in a long MuPDF call, stop it the hard way
+            job['process'].terminate()
+            result = ('cancelled',)
+        
+        if result is None:
+            self.root.after(100, self.poll_embed_job)
+        else:
+            self.finish_embed_job(result)
+    
+    def show_embed_progress(self, files_done, bytes_done, current_name):
+        job = self.job
+        elapsed = time.monotonic() - job['start_time']
+        throughput = bytes_done / elapsed if elapsed > 0 else 0
+        remaining = job['bytes_total'] - bytes_done
+        eta = f"{remaining / throughput:.0f}s" if throughput > 0 else "?"
+        self.status_label.config(
+            text=(f"Embedding {files_done}/{job['files_total']} files, "
+                  f"{format_size(bytes_done)} / {format_size(job['bytes_total'])} "
+                  f"({format_size(throughput)}/s, ETA {eta}) - {current_name}"),
+            foreground="blue")
+    
+    def cancel_embed(self):
+        if self.transform is not None:
+            self.transform['executor'].shutdown(wait=False, cancel_futures=True)
+            self.transform = None
+            self.embed_button.config(state=tk.NORMAL)
+            self.cancel_button.config(state=tk.DISABLED)
+            self.status_label.config(text="Embedding cancelled, no output written", foreground="red")
+            return
+        if self.job is not None and self.job['cancel_time'] is None:
+            self.job['cancel_event'].set()
+            self.job['cancel_time'] = time.monotonic()
+            self.status_label.config(text="Cancelling...", foreground="blue")
+    
+    def finish_embed_job(self, result):
+        job, self.job = self.job, None
+        job['process'].join(timeout=1)
+        remove_file(job['temp_path'])  # already renamed away on success
+        remove_file(job['compact_path'])
+        self.embed_button.config(state=tk.NORMAL)
+        self.cancel_button.config(state=tk.DISABLED)
+        
+        if result[0] == 'done':
+            embedded_count, failures, skipped = result[1], result[2], result[3]
+            for file_path, error in failures:
+                messagebox.showwarning("Warning", f"Failed to embed {pathlib.Path(file_path).name}: {error}")
+            summary = f"Successfully embedded {embedded_count} files"
+            if skipped:
+                summary += f", skipped {len(skipped)} duplicates"
+            self.status_label.config(text=summary, foreground="green")
+            details = ""
+            if job['transform_summary']:
+                details += f"\n\n{job['transform_summary']}"
+            if skipped:
+                details += "\n\nSkipped:" + "".join(f"\n{embed_name}: {reason}" for file_path, embed_name, reason in skipped[:20])
+                if len(skipped) > 20:
+                    details += f"\n... and {len(skipped) - 20} more"
+            messagebox.showinfo("Success", f"{summary} to {job['output_path']}{details}")
+        elif result[0] == 'cancelled':
+            self.status_label.config(text="Embedding cancelled, no output written", foreground="red")
+        else:
+            self.status_label.config(text="Error occurred", foreground="red")
+            messagebox.showerror("Error", f"Error embedding files: {result[1]}")
+
+    def show_attachments_dialog(self):
+        if not self.pdf_file.get():
+            messagebox.showerror("Error", "Please select a PDF file.")
+            return
+        
+        pdf_path = self.pdf_file.get()
+        try:
+            with pymupdf.open(pdf_path) as doc:
+                attachments = list_attachments(doc)
+        except Exception as e:
+            messagebox.showerror("Error", f"Error reading attachments: {str(e)}")
+            return
+        
+        dialog = tk.Toplevel(self.root)
+        dialog.title(f"Attachments - {os.path.basename(pdf_path)}")
+        dialog.geometry("700x400")
+        dialog.transient(self.root)
+        
+        main_frame = ttk.Frame(dialog, padding="10")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+        total_bytes = sum(max(attachment['size'], 0) for attachment in attachments)
+        ttk.Label(main_frame, text=f"{len(attachments)} attachments, {format_size(total_bytes)}").pack(anchor=tk.W)
+        
+        list_frame = ttk.Frame(main_frame)
+        list_frame.pack(fill=tk.BOTH, expand=True)
+        attachment_tree = ttk.Treeview(list_frame, columns=('Name', 'Size', 'Stored', 'Checksum'), show='headings')
+        attachment_tree.heading('Name', text='Name')
+        attachment_tree.heading('Size', text='Size')
+        attachment_tree.heading('Stored', text='Stored')
+        attachment_tree.heading('Checksum', text='MD5 Checksum')
+        attachment_tree.column('Name', width=250)
+        attachment_tree.column('Size', width=80, anchor=tk.E)
+        attachment_tree.column('Stored', width=80, anchor=tk.E)
+        attachment_tree.column('Checksum', width=240)
+        scrollbar = ttk.Scrollbar(list_frame, orient="vertical", command=attachment_tree.yview)
+        attachment_tree.configure(yscrollcommand=scrollbar.set)
+        attachment_tree.pack(side="left", fill="both", expand=True)
+        scrollbar.pack(side="right", fill="y")
+        
+        for index, attachment in enumerate(attachments):
+            attachment_tree.insert('', 'end', iid=str(index), values=(
+                attachment['name'],
+                format_size(attachment['size']) if attachment['size'] >= 0 else "?",
+                format_size(attachment['length']) if attachment['length'] >= 0 else "?",
+                attachment['checksum']))
+        
+        status_label = ttk.Label(dialog, text="Ready", foreground="green")
+        status_label.pack(fill=tk.X, padx=10)
+        button_frame = ttk.Frame(dialog)
+        button_frame.pack(fill=tk.X, padx=10, pady=10)
+        extract_job = {}
+        
+        def start_extract(items):
+            if not items:
+                messagebox.showwarning("Warning", "Please select attachments to extract.", parent=dialog)
+                return
+            output_dir = filedialog.askdirectory(title="Extract Attachments To", parent=dialog)
+            if not output_dir:
+                return
+            
+            # Extraction also runs in its own process, MuPDF would block the window otherwise
+            messages = multiprocessing.Queue()
+            cancel_event = multiprocessing.Event()
+            process = multiprocessing.Process(target=run_extract_job,
+                                              args=(pdf_path, output_dir, items, messages, cancel_event), daemon=True)
+            process.start()
+            extract_job.update(process=process, messages=messages, cancel_event=cancel_event,
+                               files_total=len(items), start_time=time.monotonic())
+            extract_selected_button.config(state=tk.DISABLED)
+            extract_all_button.config(state=tk.DISABLED)
+            cancel_extract_button.config(state=tk.NORMAL)
+            status_label.config(text="Extracting...", foreground="blue")
+            dialog.after(100, poll_extract)
+        
+        def poll_extract():
+            if not extract_job or not dialog.winfo_exists():
+                return
+            result = None
+            try:
+                while True:
+                    message = extract_job['messages'].get_nowait()
+                    if message[0] == 'progress':
+                        files_done, bytes_done, current_name = message[1:]
+                        elapsed = time.monotonic() - extract_job['start_time']
+                        status_label.config(text=(f"Extracting {files_done}/{extract_job['files_total']}, "
+                                                  f"{format_size(bytes_done)} ({format_size(bytes_done / elapsed if elapsed > 0 else 0)}/s)"
+                                                  f" - {current_name}"), foreground="blue")
+                    else:
+                        result = message
+            except queue.Empty:
+                pass
+            if result is None and not extract_job['process'].is_alive():
+                result = ('error', f"Extraction process exited with code {extract_job['process'].exitcode}")
+            if result is None:
+                dialog.after(100, poll_extract)
+                return
+            
+            extract_job['process'].join(timeout=1)
+            extract_job.clear()
+            extract_selected_button.config(state=tk.NORMAL)
+            extract_all_button.config(state=tk.NORMAL)
+            cancel_extract_button.config(state=tk.DISABLED)
+            if result[0] == 'done':
+                extracted_count, bytes_done, failures = result[1:]
+                for name, error in failures[:20]:
+                    messagebox.showwarning("Warning", f"Failed to extract {name}: {error}", parent=dialog)
+                status_label.config(text=f"Extracted {extracted_count} attachments ({format_size(bytes_done)})",
+                                    foreground="green" if not failures else "red")
+            elif result[0] == 'cancelled':
+                status_label.config(text=f"Extraction cancelled after {result[1]} attachments", foreground="red")
+            else:
+                status_label.config(text="Error occurred", foreground="red")
+                messagebox.showerror("Error", f"Error extracting attachments: {result[1]}", parent=dialog)
+        
+        def cancel_extract():
+            if extract_job:
+                extract_job['cancel_event'].set()
+                status_label.config(text="Cancelling...", foreground="blue")
+        
+        def close_dialog():
+            cancel_extract()
+            dialog.destroy()
+        
+        extract_selected_button = ttk.Button(button_frame, text="Extract Selected", command=lambda: start_extract(
+            [attachments[int(iid)] for iid in attachment_tree.selection()]))
+        extract_selected_button.pack(side=tk.LEFT, padx=5)
+        extract_all_button = ttk.Button(button_frame, text="Extract All", command=lambda: start_extract(attachments))
+        extract_all_button.pack(side=tk.LEFT, padx=5)
+        cancel_extract_button = ttk.Button(button_frame, text="Cancel", command=cancel_extract, state=tk.DISABLED)
+        cancel_extract_button.pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Close", command=close_dialog).pack(side=tk.RIGHT, padx=5)
+        dialog.protocol("WM_DELETE_WINDOW", close_dialog)
 
 # Import simpledialog for embed name input
 import tkinter.simpledialog
 
 def main():
+    multiprocessing.freeze_support()
     root = tk.Tk()
     app = PDFEmbedderGUI(root)
     root.mainloop()
@@ -0,0 +1,217 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import pathlib
+import sys
+import tempfile
+import time
+
+from embwalk import (BMP_FORMATS, DEFAULT_MEMORY_LIMIT, SAVE_MODES, embed_into_pdf, find_duplicates, format_size,
+                     publish_file, remove_file, transform_images)
+
+
+def parse_file_entry(entry, base_dir):
+    # "path" or {"path": ..., "name": ...}, relative paths are taken from the manifest's directory
+    if isinstance(entry, str):
+        entry = {"path": entry}
+    file_path = base_dir / entry["path"]
+    return file_path, entry.get("name") or file_path.name
+
+
+def load_manifest(path):
+    """Read embed jobs from a JSON or CSV manifest.
+
+    JSON is either a list of {"pdf", "files", optional "output"} objects or
+    an object mapping PDF paths to file lists; files are paths or
+    {"path", "name"} objects. CSV has a header with pdf and file columns and
+    optional name and output columns, one row per attached file.
+    Returns a list of (pdf path, output path or None, [(file, embed name)]).
+    """
+    path = pathlib.Path(path)
+    base_dir = path.parent
+    jobs = {}
+
+    if path.suffix.lower() == ".csv":
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                pdf = str(base_dir / row["pdf"])
+                output = row.get("output") or None
+                job = jobs.setdefault(pdf, [pdf, str(base_dir / output) if output else None, []])
+                job[2].append(parse_file_entry({"path": row["file"], "name": row.get("name")}, base_dir))
+        return [tuple(job) for job in jobs.values()]
+
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    if isinstance(manifest, dict):
+        manifest = [{"pdf": pdf, "files": files} for pdf, files in manifest.items()]
+    for entry in manifest:
+        pdf = str(base_dir / entry["pdf"])
+        output = entry.get("output")
+        job = jobs.setdefault(pdf, [pdf, str(base_dir / output) if output else None, []])
+        job[2].extend(parse_file_entry(file_entry, base_dir) for file_entry in entry["files"])
+    return [tuple(job) for job in jobs.values()]
+
+
+def default_output(pdf, base_dir, output_dir):
+    # Mirror the PDF's path below the manifest directory, so same-named PDFs in
+    # different folders get different outputs. PDFs outside it use their name.
+    try:
+        relative = os.path.relpath(pdf, base_dir)
+    except ValueError:
+        # Another drive on Windows
+        relative = os.path.basename(pdf)
+    if relative.split(os.sep)[0] == os.pardir:
+        relative = os.path.basename(pdf)
+    return str(output_dir / relative)
+
+
+def assign_outputs(jobs, base_dir, output_dir):
+    return [(pdf, output or default_output(pdf, base_dir, output_dir), files) for pdf, output, files in jobs]
+
+
+def find_output_conflicts(jobs):
+    """Problems that would make jobs overwrite a source or each other.
+
+    Paths are compared case-insensitively since that is how Windows and
+    macOS see them. Returns a list of messages, empty if all is well.
+    """
+    def path_key(path):
+        return os.path.normcase(os.path.abspath(path)).casefold()
+    
+    # Jobs run in any order, so no output may be any job's source
+    sources = {path_key(pdf): pdf for pdf, output, files in jobs}
+    problems = []
+    seen = {}
+    for pdf, output, files in jobs:
+        key = path_key(output)
+        if key == path_key(pdf):
+            problems.append(f"{pdf}: output file must differ from the source PDF")
+        elif key in sources:
+            problems.append(f"{pdf}: output {output} is the source PDF of another job")
+        elif key in seen:
+            problems.append(f"{pdf}: output {output} is also the output of {seen[key]}")
+        else:
+            seen[key] = pdf
+    return problems
+
+
+def iter_tasks(jobs, options):
+    for pdf, output, files in jobs:
+        yield pdf, output, files, options
+
+
+def embed_task(task):
+    # Runs in a pool worker, writes next to the output and renames once complete
+    pdf, output_path, files, options = task
+    start_time = time.perf_counter()
+    skipped = []
+    saved_bytes = 0
+    temp_path = None
+    embedded_bytes = 0
+    
+    def progress(files_done, bytes_done, current_name):
+        # bytes_done only counts files that were read and embedded
+        nonlocal embedded_bytes
+        embedded_bytes = bytes_done
+    
+    try:
+        output_dir = os.path.dirname(os.path.abspath(output_path))
+        os.makedirs(output_dir, exist_ok=True)
+        if options["transform"] is not None:
+            # Already in a pool worker, so images are re-encoded in this process
+            files, results = transform_images(files, options["transform"], max_workers=0)
+            saved_bytes = sum(r["original_bytes"] - r["bytes"] for r in results)
+        if options["skip_duplicates"]:
+            # Hash threads of one document are enough, the pool already uses every core
+            files, skipped = find_duplicates(pdf, files, max_workers=2)
+        fd, temp_path = tempfile.mkstemp(suffix=".part", dir=output_dir)
+        os.close(fd)
+        embedded_count, failures = embed_into_pdf(pdf, temp_path, files, options["memory_limit"], progress,
+                                                  save_mode=options["save_mode"])
+        publish_file(temp_path, output_path)
+    except Exception as e:
+        if temp_path is not None:
+            remove_file(temp_path)
+        return pdf, 0, 0, [], len(skipped), saved_bytes, time.perf_counter() - start_time, str(e)
+
+    return (pdf, embedded_count, embedded_bytes, [(str(f), error) for f, error in failures], len(skipped),
+            saved_bytes, time.perf_counter() - start_time, None)
+
+
+def format_saved(saved):
+    # Re-encoding can also make the embedded files bigger in total
+    if not saved:
+        return ""
+    if saved < 0:
+        return f", re-encoding grew files by {format_size(-saved)}"
+    return f", {format_size(saved)} saved by re-encoding"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embed files into many PDFs from a manifest (headless)")
+    parser.add_argument("manifest", help="JSON or CSV manifest of PDFs and the files to embed")
+    parser.add_argument("-o", "--output", default="embedded",
+                        help="Output directory for jobs without their own output (default: embedded)")
+    parser.add_argument("--memory-limit-mb", type=int, default=DEFAULT_MEMORY_LIMIT // (1024 * 1024),
+                        help="Attachment data held in memory per worker before it is written out")
+    parser.add_argument("--save-mode", choices=SAVE_MODES, default="full")
+    parser.add_argument("--skip-duplicates", action="store_true",
+                        help="Skip files whose content repeats another file or an existing attachment")
+    parser.add_argument("--recompress", action="store_true", help="Re-encode images before embedding")
+    parser.add_argument("--bmp-format", choices=BMP_FORMATS, default="png", help="Format BMPs are converted to")
+    parser.add_argument("--jpeg-quality", type=int, help="Re-encode JPEGs at this quality if that makes them smaller")
+    parser.add_argument("--max-dimension", type=int, help="Scale images down to at most this many pixels per side")
+    parser.add_argument("--rasterize-svg", action="store_true", help="Embed SVGs as PNG")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--tasks-per-worker", type=int, default=50,
+                        help="Restart workers after this many documents to return memory to the OS")
+    args = parser.parse_args()
+
+    jobs = load_manifest(args.manifest)
+    options = {"memory_limit": args.memory_limit_mb * 1024 * 1024, "save_mode": args.save_mode,
+               "skip_duplicates": args.skip_duplicates, "transform": None}
+    if args.recompress:
+        options["transform"] = {"bmp_format": args.bmp_format, "jpeg_quality": args.jpeg_quality,
+                                "max_dimension": args.max_dimension, "rasterize_svg": args.rasterize_svg}
+    jobs = assign_outputs(jobs, pathlib.Path(args.manifest).parent, pathlib.Path(args.output))
+    problems = find_output_conflicts(jobs)
+    if problems:
+        # Checked up front, a clash found halfway would leave a partial run behind
+        for problem in problems:
+            print(problem, file=sys.stderr)
+        sys.exit(2)
+    tasks = iter_tasks(jobs, options)
+
+    documents = failed_documents = total_files = total_bytes = total_skipped = total_saved = 0
+    start_time = time.perf_counter()
+    with multiprocessing.Pool(args.workers, maxtasksperchild=args.tasks_per_worker) as pool:
+        for pdf, embedded_count, embedded_bytes, failures, skipped, saved, seconds, error in pool.imap_unordered(embed_task, tasks):
+            documents += 1
+            if error:
+                failed_documents += 1
+                print(f"{pdf}: {error}", file=sys.stderr)
+                continue
+            total_files += embedded_count
+            total_bytes += embedded_bytes
+            total_skipped += skipped
+            total_saved += saved
+            for file_path, file_error in failures:
+                print(f"{pdf}: failed to embed {file_path}: {file_error}", file=sys.stderr)
+            print(f"{pdf}: {embedded_count} files, {format_size(embedded_bytes)}"
+                  + (f", {skipped} duplicates skipped" if skipped else "")
+                  + format_saved(saved) + f" in {seconds:.2f}s")
+
+    elapsed = time.perf_counter() - start_time
+    print(f"Processed {documents - failed_documents} of {documents} documents in {elapsed:.1f}s "
+          f"({documents / elapsed if elapsed else 0:.1f} docs/sec, "
+          f"{format_size(total_bytes / elapsed if elapsed else 0)}/s, {total_files} files embedded"
+          + (f", {total_skipped} duplicates skipped" if total_skipped else "")
+          + format_saved(total_saved) + f", {args.workers} workers)")
+    sys.exit(1 if failed_documents else 0)
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    main()
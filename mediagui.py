@@ -1,10 +1,380 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import subprocess
+import json
 import os
+import sqlite3
+import signal
 import webbrowser
 import threading
+import time
 import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Jobs running at once, and how many of those may be encodes. ffmpeg already
+# spreads a single encode over several cores, so fewer of those run together.
+MAX_JOBS = os.cpu_count() or 1
+MAX_ENCODE_JOBS = max(1, MAX_JOBS // 4)
+
+# ffmpeg progress reaches the UI at most this often, and only the end of its
+# log is kept for error messages, so long jobs don't pile up output
+PROGRESS_INTERVAL = 0.5
+STDERR_TAIL_LINES = 50
+
+# ffprobe and identify results, reused until the file changes. Probes mostly
+# wait on the disk and the child process, so they get more threads than cores.
+METADATA_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "mediagui", "metadata.sqlite3")
+METADATA_WORKERS = min(16, (os.cpu_count() or 1) * 2)
+
+def terminate_process_tree(process, force=False):
+    # The command runs through a shell, so the whole tree has to go, not just the shell
+    try:
+        if os.name == "nt":
+            subprocess.run(["taskkill", "/F", "/T", "/PID", str(process.pid)], capture_output=True)
+        else:
+            os.killpg(process.pid, signal.SIGKILL if force else signal.SIGTERM)
+    except OSError:
+        pass
+
+def file_signature(path):
+    # Identifies one version of a file: rewritten or replaced files get a new one
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns, stat.st_ino
+
+def run_ffprobe(path):
+    result = subprocess.run(["ffprobe", "-v", "error", "-show_format", "-show_streams", "-of", "json", path],
+                            capture_output=True, text=True, timeout=120)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or f"ffprobe exited with code {result.returncode}")
+    return json.loads(result.stdout)
+
+def run_identify(path):
+    result = subprocess.run(["magick", "identify", "-verbose", path], capture_output=True, text=True, timeout=120)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or f"magick exited with code {result.returncode}")
+    return result.stdout
+
+PROBES = {"ffprobe": run_ffprobe, "identify": run_identify}
+
+class MetadataCache:
+    """ffprobe and identify results kept in SQLite and probed on a thread pool.
+
+    Rows are keyed by path and tool and only used while the file's size,
+    mtime and inode still match, so a changed file is probed again. Probes
+    the tool itself rejected are cached too, a directory of non-media files
+    costs one probe each. request() returns a Future with the ffprobe JSON
+    or identify text.
+    """
+    
+    def __init__(self, db_path=METADATA_CACHE_PATH, max_workers=METADATA_WORKERS):
+        try:
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+            self.db = sqlite3.connect(db_path, check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+        except (OSError, sqlite3.Error):
+            self.db = sqlite3.connect(":memory:", check_same_thread=False)  # no persistent cache then
+        self.db.execute("CREATE TABLE IF NOT EXISTS metadata (path TEXT, tool TEXT, size INTEGER, mtime_ns INTEGER, "
+                        "inode INTEGER, result TEXT, error TEXT, PRIMARY KEY (path, tool))")
+        self.db.commit()
+        self.db_lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.pending = {}  # (path, tool) -> Future, so a file isn't probed twice at once
+        self.pending_lock = threading.Lock()
+        
+    def request(self, path, tool):
+        key = (os.path.abspath(path), tool)
+        with self.pending_lock:
+            future = self.pending.get(key)
+            if future is not None:
+                return future
+            future = self.executor.submit(self.get, *key)
+            self.pending[key] = future
+            
+        def forget(done, key=key):
+            with self.pending_lock:
+                if self.pending.get(key) is done:
+                    del self.pending[key]
+                    
+        future.add_done_callback(forget)
+        return future
+        
+    def prefetch(self, paths, tool):
+        for path in paths:
+            self.request(path, tool)
+            
+    def get(self, path, tool):
+        # Runs on the pool: stat, then the cache, then the probe itself
+        signature = file_signature(path)
+        with self.db_lock:
+            if self.db is None:
+                raise RuntimeError("Metadata cache is closed")
+            row = self.db.execute("SELECT size, mtime_ns, inode, result, error FROM metadata WHERE path = ? AND tool = ?",
+                                  (path, tool)).fetchone()
+        if row is not None and tuple(row[:3]) == signature:
+            result, error = json.loads(row[3]) if row[3] is not None else None, row[4]
+        else:
+            try:
+                result, error = PROBES[tool](path), None
+            except RuntimeError as e:
+                # The tool ran and rejected the file; a missing tool or a timeout is raised uncached
+                result, error = None, str(e)
+            with self.db_lock:
+                if self.db is not None:  # closed while the probe ran
+                    self.db.execute("INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                    (path, tool, *signature, json.dumps(result) if error is None else None, error))
+                    self.db.commit()
+        if error is not None:
+            raise RuntimeError(error)
+        return result
+        
+    def close(self):
+        # A probe still running is not waited for, it finds the connection gone and skips the write
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        with self.db_lock:
+            if self.db is not None:
+                self.db.close()  # checkpoints the WAL
+                self.db = None
+
+def media_duration(info):
+    try:
+        return float(info["format"]["duration"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+def summarize_media(info):
+    # Short description from ffprobe's JSON: container and duration, then one line per stream
+    media_format = info.get("format", {})
+    duration = media_duration(info)
+    lines = [f"{media_format.get('format_long_name') or media_format.get('format_name', '?')}"
+             + (f", {format_duration(duration)}" if duration is not None else "")]
+    for stream in info.get("streams", []):
+        kind = stream.get("codec_type", "data")
+        line = f"{kind.capitalize()}: {stream.get('codec_name', '?')}"
+        if kind == "video" and stream.get("width"):
+            line += f" {stream['width']}x{stream['height']}"
+            if stream.get("avg_frame_rate", "0/0") != "0/0":
+                numerator, _, denominator = stream["avg_frame_rate"].partition("/")
+                try:
+                    line += f" {float(numerator) / float(denominator or 1):.2f} fps"
+                except (ValueError, ZeroDivisionError):
+                    pass
+        elif kind == "audio":
+            line += f" {stream.get('sample_rate', '?')} Hz, {stream.get('channels', '?')} ch"
+        lines.append(line)
+    return "\n".join(lines)
+
+def parse_progress(block, duration=None):
+    """Turn one block of ffmpeg -progress output into numbers.
+
+    block maps the keys of the block to their values. ffmpeg writes N/A for
+    values it doesn't know yet, those come back as None, as do percent and
+    ETA without a duration.
+    """
+    def number(key, suffix=""):
+        try:
+            return float(block.get(key, "").strip().rstrip(suffix))
+        except ValueError:
+            return None
+        
+    out_time = number("out_time_us")
+    progress = {
+        "out_time": out_time / 1e6 if out_time is not None else None,
+        "fps": number("fps"),
+        "speed": number("speed", "x"),
+        "percent": None,
+        "eta": None,
+    }
+    if duration and progress["out_time"] is not None:
+        progress["percent"] = min(100.0, progress["out_time"] / duration * 100)
+        if progress["speed"]:
+            progress["eta"] = max(0.0, duration - progress["out_time"]) / progress["speed"]
+    return progress
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+class Job:
+    """A command in the job queue and what became of it.
+
+    ffmpeg jobs with track_progress report through job.progress; duration is
+    the expected output length, probed from input_path times duration_scale
+    when not given.
+    """
+    
+    def __init__(self, job_id, name, cmd, kind="light", output_widget=None, track_progress=False,
+                 input_path=None, duration=None, duration_scale=1):
+        self.id = job_id
+        self.name = name
+        self.cmd = cmd
+        self.kind = kind  # "encode" or "light"
+        self.output_widget = output_widget
+        self.state = "queued"  # queued, running, done, failed or cancelled
+        self.process = None
+        self.cancelled = False
+        self.stdout = ""
+        self.stderr = ""
+        self.start_time = None
+        self.end_time = None
+        self.track_progress = track_progress
+        self.input_path = input_path
+        self.duration = duration
+        self.duration_scale = duration_scale
+        self.progress = None
+        
+    def progress_text(self):
+        if self.state == "failed":
+            # Last line of stderr, the whole tail is in the error details window
+            lines = [line for line in self.stderr.splitlines() if line.strip()]
+            return lines[-1].strip() if lines else "Unknown error"
+        progress = self.progress
+        if not progress:
+            return ""
+        parts = []
+        if progress["percent"] is not None:
+            parts.append(f"{progress['percent']:.1f}%")
+        elif progress["out_time"] is not None:
+            parts.append(format_duration(progress["out_time"]))
+        if progress["fps"]:
+            parts.append(f"{progress['fps']:.0f} fps")
+        if progress["speed"]:
+            parts.append(f"{progress['speed']:.2f}x")
+        if progress["eta"] is not None and self.state == "running":
+            parts.append(f"ETA {format_duration(progress['eta'])}")
+        return "  ".join(parts)
+        
+    def elapsed(self):
+        if self.start_time is None:
+            return 0
+        return (self.end_time or time.monotonic()) - self.start_time
+
+class JobQueue:
+    """Runs commands with a bounded number of jobs at a time.
+
+    Scheduling happens in the Tk thread; every running job gets a thread
+    that waits on its process. on_change(job) is called in the Tk thread
+    whenever a job changes state.
+    """
+    
+    def __init__(self, root, on_change, metadata, max_jobs=MAX_JOBS, max_encodes=MAX_ENCODE_JOBS):
+        self.root = root
+        self.on_change = on_change
+        self.metadata = metadata
+        self.max_jobs = max_jobs
+        self.max_encodes = max_encodes
+        self.jobs = []
+        self.next_id = 1
+        
+    def submit(self, name, cmd, kind="light", output_widget=None, **options):
+        job = Job(self.next_id, name, cmd, kind, output_widget, **options)
+        self.next_id += 1
+        self.jobs.append(job)
+        self.on_change(job)
+        self.schedule()
+        return job
+        
+    def running(self):
+        return [job for job in self.jobs if job.state == "running"]
+        
+    def schedule(self):
+        # Start queued jobs in order while there are free slots; an encode
+        # waiting for an encode slot doesn't hold up light jobs behind it
+        running = self.running()
+        encodes = sum(1 for job in running if job.kind == "encode")
+        for job in self.jobs:
+            if len(running) >= self.max_jobs:
+                break
+            if job.state != "queued" or (job.kind == "encode" and encodes >= self.max_encodes):
+                continue
+            job.state = "running"
+            job.start_time = time.monotonic()
+            running.append(job)
+            encodes += job.kind == "encode"
+            threading.Thread(target=self.run, args=(job,), daemon=True).start()
+            self.on_change(job)
+            
+    def run(self, job):
+        # Worker thread: the process does the work, this only waits for it
+        try:
+            if job.track_progress and job.duration is None and job.input_path and job.duration_scale:
+                try:
+                    duration = media_duration(self.metadata.request(job.input_path, "ffprobe").result())
+                except Exception:
+                    duration = None
+                job.duration = duration * job.duration_scale if duration else None
+            job.process = subprocess.Popen(job.cmd, shell=True, stdout=subprocess.PIPE,
+                                           stderr=subprocess.PIPE, text=True, start_new_session=True)
+            if job.cancelled:
+                terminate_process_tree(job.process)
+            if job.track_progress:
+                self.read_progress(job)
+            else:
+                job.stdout, job.stderr = job.process.communicate()
+            failed = job.process.returncode != 0
+        except Exception as e:
+            job.stderr = str(e)
+            failed = True
+        self.root.after(0, self.finish, job, failed)
+        
+    def read_progress(self, job):
+        # ffmpeg writes key=value lines to stdout, each block ending in progress=continue
+        # or progress=end. The log on stderr is drained alongside, keeping only its tail.
+        stderr_tail = deque(maxlen=STDERR_TAIL_LINES)
+        stderr_thread = threading.Thread(target=stderr_tail.extend, args=(job.process.stderr,), daemon=True)
+        stderr_thread.start()
+        
+        block = {}
+        last_update = 0
+        for line in job.process.stdout:
+            key, _, value = line.strip().partition("=")
+            block[key] = value
+            if key == "progress":
+                # block isn't reset, so a key missing from one block keeps its last value
+                job.progress = parse_progress(block, job.duration)
+                now = time.monotonic()
+                if now - last_update >= PROGRESS_INTERVAL:
+                    last_update = now
+                    self.root.after(0, self.report_progress, job)
+        job.process.wait()
+        stderr_thread.join()
+        job.stderr = "".join(stderr_tail)
+        
+    def report_progress(self, job):
+        # May arrive after the job finished, which already reported its final state
+        if job.state == "running":
+            self.on_change(job)
+            
+    def finish(self, job, failed):
+        job.end_time = time.monotonic()
+        job.process = None
+        if job.cancelled:
+            job.state = "cancelled"
+        else:
+            job.state = "failed" if failed else "done"
+        self.on_change(job)
+        self.schedule()
+        
+    def cancel(self, job):
+        if job.state == "queued":
+            job.state = "cancelled"
+            self.on_change(job)
+        elif job.state == "running" and not job.cancelled:
+            job.cancelled = True
+            process = job.process
+            if process is not None:
+                terminate_process_tree(process)
+                # Give it a moment to clean up, then stop it the hard way
+                threading.Timer(1.0, lambda: process.poll() is None and terminate_process_tree(process, force=True)).start()
+                
+    def cancel_all(self):
+        for job in self.jobs:
+            self.cancel(job)
+            
+    def clear_finished(self):
+        finished = [job for job in self.jobs if job.state in ("done", "failed", "cancelled")]
+        self.jobs = [job for job in self.jobs if job not in finished]
+        return finished
 
 class MediaGuiApp:
     def __init__(self, root):
@@ -13,10 +383,12 @@ class MediaGuiApp:
         self.root.geometry("800x600")
         self.root.configure(bg="#f2f2f2")
         
-        self.processing = False
-        self.process = None
+        self.metadata = MetadataCache()
+        self.jobs = JobQueue(self.root, self.on_job_changed, self.metadata)
+        self.jobs_refresh_pending = False
         
         self.create_widgets()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         
     def create_widgets(self):
         # Main container
@@ -50,82 +422,124 @@ class MediaGuiApp:
         ttk.Button(action_frame, text="FFmpeg Version", command=lambda: self.show_version("ffmpeg")).pack(side=tk.LEFT, padx=5)
         ttk.Button(action_frame, text="Magick Version", command=lambda: self.show_version("magick")).pack(side=tk.LEFT, padx=5)
         
-        # Processing overlay (initially hidden)
-        self.overlay = tk.Toplevel(self.root)
-        self.overlay.withdraw()
-        self.overlay.title("Processing")
-        self.overlay.geometry("300x150")
-        self.overlay.resizable(False, False)
-        self.overlay.transient(self.root)
-        ttk.Label(self.overlay, text="Processing...", font=("Arial", 14)).pack(pady=20)
-        ttk.Button(self.overlay, text="Cancel", command=self.cancel_operation).pack(pady=10)
-        self.center_overlay()
-        
-    def center_overlay(self):
-        self.overlay.update_idletasks()
-        width = self.overlay.winfo_width()
-        height = self.overlay.winfo_height()
-        x = (self.root.winfo_screenwidth() - width) // 2
-        y = (self.root.winfo_screenheight() - height) // 2
-        self.overlay.geometry(f"{width}x{height}+{x}+{y}")
+        # Jobs panel
+        jobs_frame = ttk.LabelFrame(self.home_frame, text="Jobs", padding=5)
+        jobs_frame.pack(fill=tk.BOTH, expand=True, pady=10)
+        tree_frame = ttk.Frame(jobs_frame)
+        tree_frame.pack(fill=tk.BOTH, expand=True)
+        self.jobs_tree = ttk.Treeview(tree_frame, columns=("Job", "State", "Progress", "Time"), show="headings", height=8)
+        self.jobs_tree.heading("Job", text="Job")
+        self.jobs_tree.heading("State", text="State")
+        self.jobs_tree.heading("Progress", text="Progress")
+        self.jobs_tree.heading("Time", text="Time")
+        self.jobs_tree.column("Job", width=300)
+        self.jobs_tree.column("Progress", width=220)
+        self.jobs_tree.column("State", width=100)
+        self.jobs_tree.column("Time", width=80, anchor=tk.E)
+        self.jobs_tree.tag_configure("failed", foreground="red")
+        self.jobs_tree.bind("<Double-1>", lambda e: self.show_job_errors())
+        jobs_scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=self.jobs_tree.yview)
+        self.jobs_tree.configure(yscrollcommand=jobs_scrollbar.set)
+        self.jobs_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        jobs_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        jobs_buttons = ttk.Frame(jobs_frame)
+        jobs_buttons.pack(fill=tk.X, pady=(5, 0))
+        ttk.Button(jobs_buttons, text="Cancel Job", command=self.cancel_selected_jobs).pack(side=tk.LEFT, padx=5)
+        ttk.Button(jobs_buttons, text="Clear Finished", command=self.clear_finished_jobs).pack(side=tk.LEFT, padx=5)
+        ttk.Button(jobs_buttons, text="Error Details", command=self.show_job_errors).pack(side=tk.LEFT, padx=5)
+        self.jobs_summary = ttk.Label(jobs_buttons, text="")
+        self.jobs_summary.pack(side=tk.RIGHT, padx=5)
         
     def browse_file(self):
         file_path = filedialog.askopenfilename()
         if file_path:
             self.file_var.set(file_path)
+            # Probe in the background so the info is ready once the tool window opens
+            self.metadata.request(file_path, "ffprobe" if self.target_var.get() == "ffmpeg" else "identify")
             
-    def show_processing(self):
-        self.processing = True
-        self.root.config(cursor="wait")
-        for widget in self.root.winfo_children():
-            self.set_widget_state(widget, "disabled")
-        self.overlay.deiconify()
-        
-    def hide_processing(self):
-        self.processing = False
-        self.root.config(cursor="")
-        for widget in self.root.winfo_children():
-            self.set_widget_state(widget, "normal")
-        self.overlay.withdraw()
-        
-    def set_widget_state(self, widget, state):
-        try:
-            widget.configure(state=state)
-        except:
-            pass
-        for child in widget.winfo_children():
-            self.set_widget_state(child, state)
-            
-    def cancel_operation(self):
-        if self.process:
-            self.process.terminate()
-            try:
-                self.process.wait(timeout=1)
-            except subprocess.TimeoutExpired:
-                self.process.kill()
-        self.hide_processing()
+    def run_command(self, cmd, output_widget=None, name=None, kind="light"):
+        return self.jobs.submit(name or cmd, cmd, kind, output_widget)
+        
+    def run_ffmpeg(self, cmd, name, kind="light", duration=None, duration_scale=1):
+        # Machine-readable progress on stdout, parsed while the job runs
+        cmd = cmd.replace("ffmpeg ", "ffmpeg -progress pipe:1 -nostats ", 1)
+        return self.jobs.submit(name, cmd, kind, track_progress=True, input_path=self.file_var.get(),
+                                duration=duration, duration_scale=duration_scale)
+        
+    def on_job_changed(self, job):
+        iid = str(job.id)
+        values = (job.name, job.state, job.progress_text(), f"{job.elapsed():.0f}s" if job.start_time else "")
+        # Failures are marked in the list rather than each opening a dialog, many can fail at once
+        tags = ("failed",) if job.state == "failed" else ()
+        if self.jobs_tree.exists(iid):
+            self.jobs_tree.item(iid, values=values, tags=tags)
+        else:
+            self.jobs_tree.insert("", tk.END, iid=iid, values=values, tags=tags)
+        self.update_jobs_summary()
         
-    def run_command(self, cmd, output_widget=None):
-        def thread_func():
+        if job.state == "done" and job.output_widget is not None:
             try:
-                self.process = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE, 
-                                             stderr=subprocess.PIPE, text=True)
-                stdout, stderr = self.process.communicate()
-                
-                self.root.after(0, self.hide_processing)
-                
-                if self.process.returncode != 0:
-                    self.root.after(0, lambda: messagebox.showerror("Error", stderr or "Unknown error"))
-                elif output_widget:
-                    self.root.after(0, lambda: output_widget.insert(tk.END, stdout))
-                else:
-                    self.root.after(0, lambda: messagebox.showinfo("Success", "Operation completed successfully"))
-            except Exception as e:
-                self.root.after(0, lambda: messagebox.showerror("Error", str(e)))
-                self.root.after(0, self.hide_processing)
+                job.output_widget.insert(tk.END, job.stdout)
+            except tk.TclError:
+                pass  # its window was closed in the meantime
+        
+        # Keep the running times ticking
+        if job.state == "running" and not self.jobs_refresh_pending:
+            self.jobs_refresh_pending = True
+            self.root.after(1000, self.refresh_running_jobs)
+            
+    def refresh_running_jobs(self):
+        running = self.jobs.running()
+        for job in running:
+            self.jobs_tree.set(str(job.id), "Time", f"{job.elapsed():.0f}s")
+        self.jobs_refresh_pending = bool(running)
+        if running:
+            self.root.after(1000, self.refresh_running_jobs)
+            
+    def update_jobs_summary(self):
+        counts = {}
+        for job in self.jobs.jobs:
+            counts[job.state] = counts.get(job.state, 0) + 1
+        self.jobs_summary.config(text=", ".join(f"{counts[state]} {state}" for state in
+                                                ("running", "queued", "done", "failed", "cancelled") if state in counts))
+        
+    def cancel_selected_jobs(self):
+        selected = set(self.jobs_tree.selection())
+        if not selected:
+            messagebox.showwarning("Warning", "Please select a job to cancel.")
+            return
+        for job in self.jobs.jobs:
+            if str(job.id) in selected:
+                self.jobs.cancel(job)
                 
-        self.show_processing()
-        threading.Thread(target=thread_func, daemon=True).start()
+    def show_job_errors(self):
+        selected = set(self.jobs_tree.selection())
+        failed = [job for job in self.jobs.jobs if job.state == "failed" and (not selected or str(job.id) in selected)]
+        if not failed:
+            messagebox.showinfo("Error Details", "No failed jobs selected.")
+            return
+        new_window = tk.Toplevel(self.root)
+        new_window.title("Error Details")
+        new_window.geometry("700x400")
+        text_area = tk.Text(new_window, wrap=tk.WORD)
+        text_area.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        for job in failed:
+            text_area.insert(tk.END, f"{job.name}\n\n{job.stderr[-4000:] or 'Unknown error'}\n\n")
+        
+    def clear_finished_jobs(self):
+        finished = self.jobs.clear_finished()
+        if finished:
+            self.jobs_tree.delete(*(str(job.id) for job in finished))
+        self.update_jobs_summary()
+        
+    def on_close(self):
+        if self.jobs.running():
+            if not messagebox.askokcancel("Quit", "Jobs are still running. Cancel them and quit?"):
+                return
+            self.jobs.cancel_all()
+        self.metadata.close()
+        self.root.destroy()
         
     def show_version(self, tool):
         new_window = tk.Toplevel(self.root)
@@ -134,7 +548,7 @@ class MediaGuiApp:
         text_area = tk.Text(new_window, wrap=tk.WORD)
         text_area.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
         cmd = "ffmpeg -version" if tool == "ffmpeg" else "magick -version"
-        self.run_command(cmd, text_area)
+        self.run_command(cmd, text_area, name=f"{tool.capitalize()} version")
         
     def process_file(self):
         if not self.file_var.get():
@@ -156,6 +570,9 @@ class MediaGuiApp:
         
         ttk.Label(frame, text="FFmpeg", font=("Arial", 24)).pack(pady=10)
         ttk.Label(frame, text=f"File: {self.file_var.get()}").pack()
+        info_label = ttk.Label(frame, text="Reading media info...", justify=tk.LEFT)
+        info_label.pack()
+        self.show_media_info(info_label)
         
         # Convert
         convert_frame = ttk.LabelFrame(frame, text="Convert", padding=10)
@@ -307,14 +724,14 @@ class MediaGuiApp:
         fname = self.file_var.get()
         fnwx = os.path.splitext(fname)[0]
         cmd = f'ffmpeg -i "{fname}" -map 0 -c copy "{fnwx}.{new_ext}"'
-        self.run_command(cmd)
+        self.run_ffmpeg(cmd, f"Convert {os.path.basename(fname)} to {new_ext}")
         
     def ffmpeg_reverse(self):
         fname = self.file_var.get()
         fnwx = os.path.splitext(fname)[0]
         ext = os.path.splitext(fname)[1]
         cmd = f'ffmpeg -i "{fname}" -vf reverse "{fnwx}_reversed{ext}"'
-        self.run_command(cmd)
+        self.run_ffmpeg(cmd, f"Reverse {os.path.basename(fname)}", kind="encode")
         
     def ffmpeg_cut(self, fhrs, fmin, fsec, thrs, tmin, tsec):
         if not all([fhrs, fmin, fsec, thrs, tmin, tsec]):
@@ -324,7 +741,14 @@ class MediaGuiApp:
         fnwx = os.path.splitext(fname)[0]
         cmd = (f'ffmpeg -ss {fhrs}:{fmin}:{fsec} -to {thrs}:{tmin}:{tsec} '
               f'-i "{fname}" -c copy "{fnwx}_{fhrs}{fmin}{fsec}_{thrs}{tmin}{tsec}.avi"')
-        self.run_command(cmd)
+        try:
+            duration = (int(thrs) * 3600 + int(tmin) * 60 + float(tsec)) - (int(fhrs) * 3600 + int(fmin) * 60 + float(fsec))
+        except ValueError:
+            duration = None
+        # Without a valid range the input's duration would be wrong, so none is probed
+        self.run_ffmpeg(cmd, f"Cut {os.path.basename(fname)} {fhrs}:{fmin}:{fsec}-{thrs}:{tmin}:{tsec}",
+                        duration=duration if duration and duration > 0 else None,
+                        duration_scale=1 if duration and duration > 0 else None)
         
     def ffmpeg_screenshot(self, hrs, min, sec):
         if not all([hrs, min, sec]):
@@ -333,7 +757,7 @@ class MediaGuiApp:
         fname = self.file_var.get()
         fnwx = os.path.splitext(fname)[0]
         cmd = f'ffmpeg -ss {hrs}:{min}:{sec} -i "{fname}" -frames:v 1 "{fnwx}.png"'
-        self.run_command(cmd)
+        self.run_command(cmd, name=f"Screenshot {os.path.basename(fname)} at {hrs}:{min}:{sec}")
         
     def ffmpeg_scale(self, mode, value):
         if not value:
@@ -355,7 +779,7 @@ class MediaGuiApp:
             return
         sanitized_value = re.sub(r'[/\*:]', '', value)
         cmd = f'ffmpeg -i "{fname}" -vf "{fstr}" "{fnwx}_{sanitized_value}{ext}"'
-        self.run_command(cmd)
+        self.run_ffmpeg(cmd, f"Scale {os.path.basename(fname)} ({mode} {value})", kind="encode")
         
     def ffmpeg_speed(self, multiplier):
         if not multiplier:
@@ -365,11 +789,42 @@ class MediaGuiApp:
         fnwx = os.path.splitext(fname)[0]
         ext = os.path.splitext(fname)[1]
         cmd = f'ffmpeg -i "{fname}" -filter:v "setpts={multiplier}*PTS" -an "{fnwx}_{multiplier}{ext}"'
-        self.run_command(cmd)
+        try:
+            duration_scale = float(multiplier)  # setpts stretches the output by the multiplier
+        except ValueError:
+            duration_scale = None
+        self.run_ffmpeg(cmd, f"Speed {os.path.basename(fname)} x{multiplier}", kind="encode",
+                        duration_scale=duration_scale)
+        
+    def show_media_info(self, label):
+        def show(future):
+            try:
+                text = summarize_media(future.result())
+            except Exception as e:
+                text = f"No media info: {e}"
+            try:
+                label.config(text=text)
+            except tk.TclError:
+                pass  # window closed meanwhile
+                
+        future = self.metadata.request(self.file_var.get(), "ffprobe")
+        future.add_done_callback(lambda f: self.root.after(0, show, f))
         
     def magick_metadata(self, text_widget):
-        cmd = f'magick identify -verbose "{self.file_var.get()}"'
-        self.run_command(cmd, text_widget)
+        def show(future):
+            try:
+                text = future.result()
+            except Exception as e:
+                messagebox.showerror("Error", str(e))
+                return
+            try:
+                text_widget.delete("1.0", tk.END)
+                text_widget.insert(tk.END, text)
+            except tk.TclError:
+                pass  # window closed meanwhile
+                
+        future = self.metadata.request(self.file_var.get(), "identify")
+        future.add_done_callback(lambda f: self.root.after(0, show, f))
         
     def magick_modify(self, convert, resize, xcmd):
         fname = self.file_var.get()
@@ -386,7 +841,7 @@ class MediaGuiApp:
         if xcmd:
             cmd += f'{xcmd} '
         cmd += f'"{fnwx}{suffix}{newext}"'
-        self.run_command(cmd)
+        self.run_command(cmd, name=f"Modify {os.path.basename(fname)}")
 
 if __name__ == "__main__":
     root = tk.Tk()
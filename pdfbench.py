@@ -0,0 +1,282 @@
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+import pymupdf as fitz
+from PIL import Image
+
+from pdfrect import TILED_RENDER_THRESHOLD, pixmap_to_image, render_page_image, tile_clip, viewport_tiles
+
+# Viewport used for tiled renders, roughly the viewer's default canvas
+VIEWPORT_SIZE = (1000, 700)
+
+
+def make_sample_pdf():
+    # A4 page with text and line art, roughly what the viewer sees in practice
+    doc = fitz.open()
+    page = doc.new_page(width=595, height=842)
+    for i in range(60):
+        page.insert_text((40, 40 + i * 13), f"Line {i}: The quick brown fox jumps over the lazy dog " * 2, fontsize=9)
+    for i in range(50):
+        page.draw_line((20 + i * 11, 20), (575 - i * 11, 822), color=(i / 50, 0, 1 - i / 50), width=0.5)
+    return doc
+
+
+def make_text_heavy_pdf():
+    # Dense small print over several pages
+    doc = fitz.open()
+    for page_number in range(4):
+        page = doc.new_page(width=595, height=842)
+        for i in range(110):
+            page.insert_text((20, 20 + i * 7.4), f"{page_number}.{i} Lorem ipsum dolor sit amet, consectetur "
+                             "adipiscing elit, sed do eiusmod tempor incididunt ut labore et dolore", fontsize=6)
+    return doc
+
+
+def make_vector_heavy_pdf():
+    # CAD-like line work: a fine grid plus many short diagonal strokes
+    doc = fitz.open()
+    page = doc.new_page(width=842, height=595)
+    shape = page.new_shape()
+    for x in range(0, 842, 4):
+        shape.draw_line((x, 0), (x, 595))
+    for y in range(0, 595, 4):
+        shape.draw_line((0, y), (842, y))
+    shape.finish(color=(0.7, 0.7, 0.9), width=0.1)
+    for i in range(20000):
+        x, y = (i * 37) % 842, (i * 53) % 595
+        shape.draw_line((x, y), (x + 6, y + 3))
+    shape.finish(color=(0, 0, 0), width=0.3)
+    shape.commit()
+    return doc
+
+
+def make_image_heavy_pdf():
+    # A grid of photo-sized noise images, expensive to decode and scale
+    doc = fitz.open()
+    page = doc.new_page(width=595, height=842)
+    tile = Image.effect_noise((1024, 768), 64).convert("RGB")
+    buffer = io.BytesIO()
+    tile.save(buffer, "JPEG", quality=90)
+    for row in range(4):
+        for column in range(2):
+            rect = fitz.Rect(20 + column * 280, 20 + row * 205, 290 + column * 280, 215 + row * 205)
+            page.insert_image(rect, stream=buffer.getvalue())
+    return doc
+
+
+def make_huge_page_pdf():
+    # A0 sheet with text and line art, tiled by the viewer at high zoom
+    doc = fitz.open()
+    page = doc.new_page(width=2384, height=3370)
+    shape = page.new_shape()
+    for i in range(0, 2384, 20):
+        shape.draw_line((i, 0), (2384 - i, 3370))
+    shape.finish(color=(0, 0, 0.5), width=0.5)
+    shape.commit()
+    for i in range(200):
+        page.insert_text((40, 40 + i * 16), f"Sheet note {i}: check dimension {i * 7} mm", fontsize=10)
+    return doc
+
+
+SAMPLES = {
+    "text": make_text_heavy_pdf,
+    "vector": make_vector_heavy_pdf,
+    "image": make_image_heavy_pdf,
+    "huge": make_huge_page_pdf,
+}
+
+
+def render_once(page, display_list, zoom):
+    # One viewer render: a full-page raster, or the tiles in view when tiled
+    mat = fitz.Matrix(zoom, zoom)
+    page_irect = (page.rect * mat).irect
+    if page_irect.width * page_irect.height <= TILED_RENDER_THRESHOLD:
+        render_page_image(display_list, mat)
+        return "page"
+
+    # Centre the viewport on the page, like a user inspecting a detail
+    width, height = VIEWPORT_SIZE
+    left = max(0, (page_irect.width - width) // 2)
+    top = max(0, (page_irect.height - height) // 2)
+    for column, row in viewport_tiles(page_irect, left, top, width, height):
+        render_page_image(display_list, mat, tile_clip(mat, column, row))
+    return "tiled"
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def max_rss():
+    # Peak resident set size in bytes, or None where resource doesn't exist (Windows)
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def run_scenario(path, zoom, repeat, cached):
+    """Measure repeated renders of the first page of a PDF.
+
+    Runs in a fresh process so ru_maxrss reflects this scenario only.
+    """
+    baseline_rss = max_rss()
+    doc = fitz.open(path)
+    page = doc[0]
+    display_list = page.get_displaylist()
+    mode = render_once(page, display_list, zoom)  # warm up fonts and images
+
+    latencies = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        if not cached:
+            # Cold render: re-parse the content stream like an uncached page
+            display_list = doc[0].get_displaylist()
+        render_once(page, display_list, zoom)
+        latencies.append((time.perf_counter() - start_time) * 1000)
+
+    # Python-side allocations, measured separately since tracing slows rendering down.
+    # The peak is what one render needs; the snapshot difference is what it leaves behind.
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    render_once(page, display_list if cached else doc[0].get_displaylist(), zoom)
+    allocated_bytes, allocated_peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    # The first snapshot's own objects are allocated while tracing, leave them out
+    own = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    retained = after.filter_traces(own).compare_to(before.filter_traces(own), "filename")
+
+    peak_rss = max_rss()
+    return {
+        "mode": mode,
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": percentile(latencies, 0.95),
+        "mean_ms": statistics.fmean(latencies),
+        "peak_rss_bytes": peak_rss,
+        "peak_rss_delta_bytes": peak_rss - baseline_rss if peak_rss is not None else None,
+        "py_alloc_peak_bytes_per_render": allocated_peak,
+        "py_retained_blocks_per_render": sum(stat.count_diff for stat in retained),
+        "py_retained_bytes_per_render": sum(stat.size_diff for stat in retained),
+    }
+
+
+def run_suite(args):
+    os.makedirs(args.workdir, exist_ok=True)
+    paths = {}
+    for name in args.samples:
+        paths[name] = os.path.join(args.workdir, f"bench_{name}.pdf")
+        if not os.path.exists(paths[name]):
+            SAMPLES[name]().save(paths[name], deflate=True)
+
+    results = []
+    print(f"{'sample':>7} {'zoom':>5} {'cache':>6} {'mode':>6} {'p50 ms':>9} {'p95 ms':>9} {'peak RSS MB':>12} {'py peak KB':>11}")
+    for name in args.samples:
+        for zoom in args.zooms:
+            for cached in (False, True):
+                # One process per scenario keeps the RSS high-water marks apart
+                with ProcessPoolExecutor(max_workers=1) as executor:
+                    result = executor.submit(run_scenario, paths[name], zoom, args.repeat, cached).result()
+                result.update(sample=name, zoom=zoom, cached_display_list=cached)
+                results.append(result)
+                peak_rss = result['peak_rss_bytes']
+                peak_rss = f"{peak_rss / 2 ** 20:.1f}" if peak_rss is not None else "n/a"
+                print(f"{name:>7} {zoom:>4}x {'warm' if cached else 'cold':>6} {result['mode']:>6} "
+                      f"{result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f} "
+                      f"{peak_rss:>12} {result['py_alloc_peak_bytes_per_render'] / 1024:>11.1f}")
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "pymupdf": fitz.VersionBind,
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+def legacy_convert(pix):
+    # What update_display did before: PPM encode/decode and two mode conversions
+    pil_image = Image.open(io.BytesIO(pix.tobytes("ppm")))
+    return pil_image.convert('RGBA').convert('RGB')
+
+
+def fast_convert(pix):
+    return pixmap_to_image(pix)
+
+
+def measure(func, duration):
+    func()  # warm up
+    frames = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        func()
+        frames += 1
+    return frames / (time.perf_counter() - start)
+
+
+def run_convert(args):
+    doc = fitz.open(args.pdf) if args.pdf else make_sample_pdf()
+    page = doc[args.page]
+
+    # The display list takes content parsing out of the measurement, which
+    # leaves rasterization plus conversion, i.e. what a cached re-render costs
+    displaylist = page.get_displaylist()
+
+    print(f"{'zoom':>5} {'stage':>8} {'legacy fps':>11} {'fast fps':>9} {'speedup':>8}")
+    for zoom in (1, 2, 4):
+        mat = fitz.Matrix(zoom, zoom)
+        pix = displaylist.get_pixmap(matrix=mat, alpha=False)
+        stages = {
+            "convert": (lambda: legacy_convert(pix), lambda: fast_convert(pix)),
+            "frame": (lambda: legacy_convert(displaylist.get_pixmap(matrix=mat, alpha=False)),
+                      lambda: fast_convert(displaylist.get_pixmap(matrix=mat, alpha=False))),
+        }
+        for stage, (legacy_func, fast_func) in stages.items():
+            legacy = measure(legacy_func, args.duration)
+            fast = measure(fast_func, args.duration)
+            print(f"{zoom:>4}x {stage:>8} {legacy:>11.1f} {fast:>9.1f} {fast / legacy:>7.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rendering benchmarks for pdfrect")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    suite_parser = subparsers.add_parser("suite", help="Render latency and memory on synthetic PDFs")
+    suite_parser.add_argument("-o", "--output", help="Write results to this JSON file")
+    suite_parser.add_argument("--samples", nargs="+", choices=list(SAMPLES), default=list(SAMPLES))
+    suite_parser.add_argument("--zooms", nargs="+", type=float, default=[1.0, 2.0, 4.0])
+    suite_parser.add_argument("--repeat", type=int, default=10, help="Renders per scenario")
+    suite_parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "pdfbench"),
+                              help="Where the synthetic PDFs are kept")
+    suite_parser.set_defaults(func=run_suite)
+
+    convert_parser = subparsers.add_parser("convert", help="Compare pixmap-to-image conversion paths")
+    convert_parser.add_argument("pdf", nargs="?", help="PDF to render (a synthetic page is used if omitted)")
+    convert_parser.add_argument("--page", type=int, default=0)
+    convert_parser.add_argument("--duration", type=float, default=2.0, help="Seconds to run each measurement")
+    convert_parser.set_defaults(func=run_convert)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
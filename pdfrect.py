@@ -2,7 +2,636 @@ import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import pymupdf as fitz
 from PIL import Image, ImageTk, ImageDraw
-import io
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import bisect
+import hashlib
+import json
+import os
+import string
+import threading
+import time
+
+
+# Rectangle colors as RGB
+COLOR_MAP = {
+    "red": (255, 0, 0),
+    "blue": (0, 0, 255),
+    "green": (0, 255, 0),
+    "yellow": (255, 255, 0),
+    "orange": (255, 165, 0),
+    "purple": (128, 0, 128),
+    "black": (0, 0, 0)
+}
+
+
+# Thumbnail sidebar
+THUMBNAIL_SIZE = (120, 160)
+THUMBNAIL_PADDING = 10
+THUMBNAIL_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "pdfrect", "thumbnails")
+
+
+def rgb_to_hex(rgb):
+    return "#%02x%02x%02x" % rgb
+
+
+def opacity_stipple(opacity):
+    # Tk canvas items have no alpha channel, so approximate opacity with
+    # the built-in stipple bitmaps (an empty stipple is a solid fill)
+    if opacity < 0.2:
+        return "gray12"
+    if opacity < 0.4:
+        return "gray25"
+    if opacity < 0.65:
+        return "gray50"
+    if opacity < 0.9:
+        return "gray75"
+    return ""
+
+
+def pixmap_to_image(pix):
+    # Read the pixmap samples straight from MuPDF's buffer instead of
+    # round-tripping through an encoded PPM
+    mode = "RGB" if pix.n == 3 else "L"
+    return Image.frombuffer(mode, (pix.width, pix.height), pix.samples_mv, "raw", mode, pix.stride, 1)
+
+
+def render_page_image(display_list, mat, clip=None):
+    # The viewer's render path: display list -> pixmap -> PIL image
+    return pixmap_to_image(display_list.get_pixmap(matrix=mat, clip=clip, alpha=False))
+
+
+def tile_clip(mat, column, row):
+    # Page area covered by a tile, tiles are TILE_SIZE pixels at the given zoom
+    tile_rect = fitz.Rect(column * TILE_SIZE, row * TILE_SIZE, (column + 1) * TILE_SIZE, (row + 1) * TILE_SIZE)
+    return tile_rect * ~mat
+
+
+def viewport_tiles(page_irect, left, top, width, height):
+    # Tiles intersecting a viewport given in device pixels
+    left, top = max(0, int(left)), max(0, int(top))
+    right = min(page_irect.width, left + width)
+    bottom = min(page_irect.height, top + height)
+    return [(column, row)
+            for row in range(top // TILE_SIZE, (bottom - 1) // TILE_SIZE + 1)
+            for column in range(left // TILE_SIZE, (right - 1) // TILE_SIZE + 1)]
+
+
+class PageCache:
+    """LRU cache of rendered page images, bounded by total size in bytes."""
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries = OrderedDict()  # key -> (image, nbytes)
+        self._lock = threading.Lock()  # prefetch results arrive off the Tk thread
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, image):
+        nbytes = image.width * image.height * len(image.getbands())
+        if nbytes > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+
+            self._entries[key] = (image, nbytes)
+            self.current_bytes += nbytes
+
+            # Evict least recently used entries until we are back under budget
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_bytes) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_bytes
+
+    def discard_document(self, doc_key):
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == doc_key]:
+                self.current_bytes -= self._entries.pop(key)[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+
+class RectIndex:
+    """Uniform grid over page coordinates for culling and hit-testing many rectangles."""
+
+    def __init__(self, rects, labels=None, cell_size=64):
+        self.cell_size = cell_size
+        # Stored with x0 <= x1 and y0 <= y1, an inverted rectangle would fall in no cell
+        self.rects = [(min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)) for x0, y0, x1, y1 in rects]
+        self.labels = labels if labels is not None else [""] * len(self.rects)
+        self.cells = defaultdict(list)  # (column, row) -> rect indices
+        for index, (x0, y0, x1, y1) in enumerate(self.rects):
+            for cell in self._cells(x0, y0, x1, y1):
+                self.cells[cell].append(index)
+
+    def __len__(self):
+        return len(self.rects)
+
+    def _cells(self, x0, y0, x1, y1):
+        size = self.cell_size
+        for column in range(int(x0 // size), int(x1 // size) + 1):
+            for row in range(int(y0 // size), int(y1 // size) + 1):
+                yield column, row
+
+    def query(self, x0, y0, x1, y1):
+        # Indices of rectangles intersecting the given region
+        found = set()
+        for cell in self._cells(x0, y0, x1, y1):
+            found.update(self.cells.get(cell, ()))
+        return sorted(i for i in found
+                      if self.rects[i][0] <= x1 and self.rects[i][2] >= x0
+                      and self.rects[i][1] <= y1 and self.rects[i][3] >= y0)
+
+    def query_point(self, x, y):
+        # Indices of rectangles containing the point, smallest first
+        size = self.cell_size
+        hits = [i for i in self.cells.get((int(x // size), int(y // size)), ())
+                if self.rects[i][0] <= x <= self.rects[i][2] and self.rects[i][1] <= y <= self.rects[i][3]]
+        return sorted(hits, key=lambda i: (self.rects[i][2] - self.rects[i][0]) * (self.rects[i][3] - self.rects[i][1]))
+
+
+def parse_rect_entries(entries, default_page=0):
+    """Group rectangle entries by page.
+
+    Entries are [x0, y0, x1, y1] lists, which go to default_page, or
+    {"page": n, "rect": [...], "label": "..."} objects with 1-based pages.
+    Returns {page index: ([rects], [labels])}.
+    """
+    pages = defaultdict(lambda: ([], []))
+    for entry in entries:
+        if isinstance(entry, dict):
+            page = entry.get("page")
+            rects, labels = pages[int(page) - 1 if page is not None else default_page]
+            rects.append(tuple(float(v) for v in entry["rect"]))
+            labels.append(str(entry.get("label", "")))
+        else:
+            rects, labels = pages[default_page]
+            rects.append(tuple(float(v) for v in entry))
+            labels.append("")
+    return dict(pages)
+
+
+def load_rect_manifest(path, default_page=0):
+    # Read layer rectangles from a JSON file, see parse_rect_entries
+    with open(path, encoding="utf-8") as f:
+        return parse_rect_entries(json.load(f), default_page)
+
+
+def draw_overlay(image, page_rect, rects, zoom, color="red", opacity=0.3, show_border=True):
+    """Draw the page border and translucent rectangles onto a rendered page.
+
+    This is the headless counterpart of the viewer's canvas overlay, with
+    real alpha blending instead of stipples. Returns a new RGB image.
+    """
+    mat = fitz.Matrix(zoom, zoom)
+    image = image.convert("RGBA")
+    
+    if show_border:
+        scaled_page_rect = page_rect * mat
+        ImageDraw.Draw(image).rectangle(
+            [scaled_page_rect.x0, scaled_page_rect.y0, scaled_page_rect.x1 - 1, scaled_page_rect.y1 - 1],
+            outline=(0, 0, 0, 255),
+            width=2
+        )
+    
+    if rects:
+        rgb = COLOR_MAP.get(color, COLOR_MAP["red"])
+        overlay = Image.new("RGBA", image.size, (0, 0, 0, 0))
+        overlay_draw = ImageDraw.Draw(overlay)
+        for rect in rects:
+            scaled_rect = fitz.Rect(rect) * mat
+            overlay_draw.rectangle(
+                [scaled_rect.x0, scaled_rect.y0, scaled_rect.x1, scaled_rect.y1],
+                fill=rgb + (int(opacity * 255),),
+                outline=rgb + (255,),
+                width=2
+            )
+        image = Image.alpha_composite(image, overlay)
+    
+    return image.convert("RGB")
+
+
+class DisplayListCache:
+    """LRU cache of parsed page content, so re-zooming skips content-stream parsing."""
+
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # (doc_key, page index) -> DisplayList
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, doc_key, page):
+        key = (doc_key, page.number)
+        display_list = self._entries.get(key)
+        if display_list is not None:
+            self._entries.move_to_end(key)
+            return display_list
+
+        display_list = page.get_displaylist()
+        self._entries[key] = display_list
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return display_list
+
+    def discard_document(self, doc_key):
+        for key in [k for k in self._entries if k[0] == doc_key]:
+            del self._entries[key]
+
+    def clear(self):
+        self._entries.clear()
+
+
+# Documents opened by the current prefetch worker process, MuPDF documents
+# can't be shared across processes or threads
+_worker_documents = {}  # path -> (file version, Document)
+_worker_display_lists = DisplayListCache()
+
+
+_worker_fingerprints = {}
+
+
+def file_version(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def open_worker_document(path, version=None):
+    # Reopened when the file changed on disk, the old document would render stale pages
+    version = version or file_version(path)
+    entry = _worker_documents.get(path)
+    if entry is None or entry[0] != version:
+        _worker_display_lists.clear()
+        for old_version, old_doc in _worker_documents.values():
+            old_doc.close()
+        _worker_documents.clear()
+        entry = _worker_documents[path] = (version, fitz.open(path))
+    return entry[1]
+
+
+def file_fingerprint(path, version=None):
+    # SHA-256 of the file contents, remembered per (path, size, mtime)
+    key = (path, *(version or file_version(path)))
+    digest = _worker_fingerprints.get(key)
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                sha.update(chunk)
+        digest = _worker_fingerprints[key] = sha.hexdigest()
+    return digest
+
+
+def render_page_data(path, page_index, zoom):
+    # Runs in a worker process, so the result is sent back as raw samples
+    doc = open_worker_document(path)
+    display_list = _worker_display_lists.get(path, doc[page_index])
+    pix = display_list.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+    mode = "RGB" if pix.n == 3 else "L"
+    return mode, (pix.width, pix.height), pix.samples
+
+
+def render_thumbnail_data(path, page_index, max_size, cache_dir):
+    # Runs in a worker process; thumbnails are kept on disk per file hash and page
+    width, height = max_size
+    version = file_version(path)
+    cache_path = os.path.join(cache_dir, file_fingerprint(path, version), f"{page_index}_{width}x{height}.png")
+    try:
+        with Image.open(cache_path) as image:
+            image = image.convert("RGB")
+            return image.mode, image.size, image.tobytes()
+    except OSError:
+        pass
+    
+    page = open_worker_document(path, version)[page_index]
+    zoom = min(width / page.rect.width, height / page.rect.height)
+    image = pixmap_to_image(page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False))
+    if file_version(path) != version:
+        # Changed while hashing or rendering, the pixels may not match the fingerprint
+        return image.mode, image.size, image.tobytes()
+    
+    try:
+        # Write under a temporary name so a concurrent reader never sees half a file
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        temp_path = f"{cache_path}.{os.getpid()}.tmp"
+        image.save(temp_path, "PNG")
+        os.replace(temp_path, cache_path)
+    except OSError:
+        pass  # the disk cache is optional
+    return image.mode, image.size, image.tobytes()
+
+
+class ThumbnailLoader:
+    """Renders thumbnails in a worker process and hands them to the Tk thread."""
+
+    def __init__(self, root, on_loaded, max_size=THUMBNAIL_SIZE, cache_dir=THUMBNAIL_CACHE_DIR):
+        self.root = root
+        self.on_loaded = on_loaded
+        self.max_size = max_size
+        self.cache_dir = cache_dir
+        self.executor = None
+        self.futures = {}  # (path, page index) -> Future
+        self._lock = threading.Lock()  # futures is also changed by done callbacks off the Tk thread
+
+    def request(self, path, pages):
+        # Only the pages asked for last are wanted, anything else still queued is cancelled
+        keys = {(path, page_index) for page_index in pages}
+        with self._lock:
+            stale = [self.futures.pop(k) for k in list(self.futures) if k not in keys]
+        for future in stale:
+            future.cancel()
+        
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=1)
+        
+        for key in keys:
+            with self._lock:
+                if key in self.futures:
+                    continue
+                future = self.futures[key] = self.executor.submit(render_thumbnail_data, path, key[1],
+                                                                  self.max_size, self.cache_dir)
+            # Outside the lock, an already finished future runs the callback right here
+            future.add_done_callback(lambda f, key=key: self._deliver(f, key))
+
+    def _deliver(self, future, key):
+        with self._lock:
+            if future.cancelled() or self.futures.get(key) is not future:
+                return
+            del self.futures[key]
+        try:
+            mode, size, samples = future.result()
+        except Exception:
+            return
+        image = Image.frombytes(mode, size, samples)
+        self.root.after(0, lambda: self.on_loaded(key[0], key[1], image))
+
+    def cancel(self):
+        with self._lock:
+            futures, self.futures = self.futures, {}
+        for future in futures.values():
+            future.cancel()
+
+    def shutdown(self):
+        self.cancel()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+
+def extract_words_data(path, page_indices):
+    # Runs in a worker process; word boxes and text for each page
+    doc = open_worker_document(path)
+    return [(page_index, [word[:5] for word in doc[page_index].get_text("words")])
+            for page_index in page_indices]
+
+
+def normalize_word(word):
+    return word.strip(string.punctuation).lower()
+
+
+class TextIndex:
+    """Inverted index of page words, filled one page at a time."""
+
+    def __init__(self, page_count):
+        self.page_count = page_count
+        self.pages = {}  # page index -> [(x0, y0, x1, y1, normalized word)]
+        self.postings = defaultdict(list)  # normalized word -> [(page index, word index)]
+        self._vocabulary = []
+        self._vocabulary_dirty = False
+        self._lock = threading.Lock()  # pages are added from the indexer's thread
+
+    @property
+    def complete(self):
+        return len(self.pages) == self.page_count
+
+    def add_page(self, page_index, words):
+        entries = [(x0, y0, x1, y1, normalize_word(text)) for x0, y0, x1, y1, text in words]
+        with self._lock:
+            # A page indexed twice would duplicate its postings
+            if page_index in self.pages:
+                return
+            self.pages[page_index] = entries
+            for word_index, entry in enumerate(entries):
+                if entry[4]:
+                    self.postings[entry[4]].append((page_index, word_index))
+            self._vocabulary_dirty = True
+
+    def _matching_words(self, prefix):
+        # Words of the index starting with prefix, found by bisecting the sorted vocabulary
+        if self._vocabulary_dirty:
+            self._vocabulary = sorted(self.postings)
+            self._vocabulary_dirty = False
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        end = bisect.bisect_left(self._vocabulary, prefix + "\uffff")
+        return self._vocabulary[start:end]
+
+    def search(self, query):
+        """Find a phrase, the last word may be incomplete.
+
+        Returns [(page index, (x0, y0, x1, y1))] in reading order.
+        """
+        terms = [normalize_word(term) for term in query.split()]
+        terms = [term for term in terms if term]
+        if not terms:
+            return []
+        
+        with self._lock:
+            if len(terms) == 1:
+                starts = [p for word in self._matching_words(terms[0]) for p in self.postings[word]]
+            else:
+                starts = list(self.postings.get(terms[0], ()))
+            
+            hits = []
+            for page_index, word_index in starts:
+                words = self.pages[page_index]
+                span = words[word_index:word_index + len(terms)]
+                if len(span) < len(terms):
+                    continue
+                if any(span[k][4] != terms[k] for k in range(1, len(terms) - 1)):
+                    continue
+                if len(terms) > 1 and not span[-1][4].startswith(terms[-1]):
+                    continue
+                
+                rect = (min(entry[0] for entry in span), min(entry[1] for entry in span),
+                        max(entry[2] for entry in span), max(entry[3] for entry in span))
+                hits.append((page_index, word_index, rect))
+        
+        hits.sort(key=lambda hit: (hit[0], hit[1]))
+        return [(page_index, rect) for page_index, word_index, rect in hits]
+
+
+class TextIndexer:
+    """Builds a TextIndex in a worker process, a few pages per task."""
+
+    def __init__(self, root, on_progress, pages_per_task=16):
+        self.root = root
+        self.on_progress = on_progress
+        self.pages_per_task = pages_per_task
+        self.executor = None
+        self.futures = []
+
+    def build(self, path, index):
+        self.cancel()
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=1)
+        
+        missing = [p for p in range(index.page_count) if p not in index.pages]
+        for start in range(0, len(missing), self.pages_per_task):
+            future = self.executor.submit(extract_words_data, path, missing[start:start + self.pages_per_task])
+            future.add_done_callback(lambda f: self._add(f, path, index))
+            self.futures.append(future)
+
+    def _add(self, future, path, index):
+        if future.cancelled():
+            return
+        try:
+            pages = future.result()
+        except Exception:
+            return
+        for page_index, words in pages:
+            index.add_page(page_index, words)
+        self.root.after(0, lambda: self.on_progress(path, index))
+
+    def cancel(self):
+        for future in self.futures:
+            future.cancel()
+        self.futures = []
+
+    def shutdown(self):
+        self.cancel()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+
+class PagePrefetcher:
+    """Renders pages into a PageCache ahead of time in a worker process.
+
+    MuPDF holds the GIL while rasterizing, so a thread would still freeze
+    the Tk event loop.
+    """
+
+    def __init__(self, cache, max_workers=1):
+        self.cache = cache
+        self.max_workers = max_workers
+        self.executor = None
+        self.futures = {}  # cache key -> Future
+        self._lock = threading.Lock()  # futures is also changed by done callbacks off the Tk thread
+
+    def prefetch(self, path, doc_key, requests):
+        # Replaces whatever was queued before, requests are (page_index, zoom).
+        # Renders that are still wanted keep running, the rest are cancelled.
+        keys = {(doc_key, page_index, round(zoom, 4)): (page_index, zoom) for page_index, zoom in requests}
+        with self._lock:
+            stale = [self.futures.pop(k) for k in list(self.futures) if k not in keys]
+        for future in stale:
+            future.cancel()
+        
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        
+        for key, (page_index, zoom) in keys.items():
+            if key in self.cache:
+                continue
+            with self._lock:
+                if key in self.futures:
+                    continue
+                future = self.futures[key] = self.executor.submit(render_page_data, path, page_index, zoom)
+            # Outside the lock, an already finished future runs the callback right here
+            future.add_done_callback(lambda f, key=key: self._store(f, key))
+
+    def wait_for(self, key):
+        # Waiting on a render that is already running beats starting a second one
+        with self._lock:
+            future = self.futures.get(key)
+        if future is None:
+            return self.cache.get(key)  # may have been stored since the caller looked
+        if not (future.running() or future.done()):
+            return None
+        try:
+            mode, size, samples = future.result()
+        except Exception:
+            return None
+        # result() can return before the done callback has stored the page, so store it here
+        image = Image.frombytes(mode, size, samples)
+        self._finish(future, key, image)
+        return image
+
+    def _store(self, future, key):
+        # Called on the executor's thread; results nobody wants anymore are dropped
+        if future.cancelled():
+            return
+        try:
+            mode, size, samples = future.result()
+        except Exception:
+            # Prefetching is best effort, the Tk thread renders and reports errors
+            return
+        self._finish(future, key, Image.frombytes(mode, size, samples))
+
+    def _finish(self, future, key, image):
+        # Cached before leaving futures, so prefetch never finds a page in neither and renders it again
+        with self._lock:
+            if self.futures.get(key) is not future:
+                return
+            self.cache.put(key, image)
+            del self.futures[key]
+
+    def cancel(self):
+        with self._lock:
+            futures, self.futures = self.futures, {}
+        for future in futures.values():
+            future.cancel()
+
+    def shutdown(self):
+        self.cancel()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+
+# Pages larger than this many pixels at the current zoom are rendered in tiles
+TILED_RENDER_THRESHOLD = 4096 * 4096
+TILE_SIZE = 512
+
+# Above this many visible layer rectangles, draw them into one image instead
+# of creating a canvas item per rectangle
+MAX_LAYER_ITEMS = 2000
+LAYER_COLOR = (0, 0, 255)
+HIT_COLOR = (255, 0, 255)
+
+# Text indexes kept for recently opened documents
+MAX_TEXT_INDEXES = 4
+SEARCH_HIT_COLOR = (255, 255, 0)
+CURRENT_HIT_COLOR = (255, 128, 0)
+
+# Number of pages before and after the current one to render in the background
+PREFETCH_DISTANCE = 2
+
+# Delay after the last resize event before rendering at full quality
+RESIZE_SETTLE_MS = 200
+
+# Drags shorter than this (in screen pixels) are clicks, not a new rectangle
+MIN_DRAW_PIXELS = 4
+
 
 class PDFViewerApp:
     def __init__(self, root):
@@ -17,9 +646,58 @@ class PDFViewerApp:
         self.zoom_factor = 1.0
         self.photo = None
         self.fit_to_window = True  # New flag for fit-to-window mode
+        self.doc_key = None
+        self.page_cache = PageCache()
+        self.display_lists = DisplayListCache()
+        self.prefetcher = PagePrefetcher(self.page_cache)
+        self.prefetch_distance = PREFETCH_DISTANCE
+        self.rect_item = None
+        self.rect_photos = []
+        self.drag_state = None
+        # Tk only draws stipples reliably on X11, elsewhere fills use alpha images
+        self.stipple_supported = self.root.tk.call("tk", "windowingsystem") == "x11"
+        self.rect_layers = {}  # page index -> RectIndex
+        self.layer_photo = None
+        self.hover_hit = None
+        
+        # Thumbnail sidebar, only the slots scrolled into view hold images
+        self.thumb_loader = ThumbnailLoader(self.root, self.on_thumbnail_loaded)
+        self.thumb_photos = {}  # page index -> PhotoImage
+        self.thumb_refresh_pending = False
+        self.thumb_scrollregion = None
+        self.thumb_view = None  # last (first, last) fractions from the thumbnail canvas
+        
+        # Text search, indexes are built in the background per document
+        self.text_indexer = TextIndexer(self.root, self.on_index_progress)
+        self.text_indexes = OrderedDict()  # doc key -> TextIndex
+        self.search_hits = []  # [(page index, (x0, y0, x1, y1))]
+        self.search_hit = None
+        self.search_photos = []
+        
+        # Tiled rendering state, used when the full page raster would be too big
+        self.tiled = False
+        self.tile_items = {}  # (column, row) -> (canvas item, PhotoImage)
+        self.tile_queue = []
+        self.tile_job = None
+        self.view_refresh_pending = False
+        
+        # Window resizes are coalesced into a single render once they settle
+        self.display_image = None
+        self.resize_job = None
+        self.render_count = 0
+        self.preview_count = 0
+        self.last_render_ms = 0.0
+        self.total_render_ms = 0.0
         
         # Create the GUI
         self.create_widgets()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
+    def on_close(self):
+        self.prefetcher.shutdown()
+        self.thumb_loader.shutdown()
+        self.text_indexer.shutdown()
+        self.root.destroy()
         
     def create_widgets(self):
         # Main frame
@@ -49,10 +727,36 @@ class PDFViewerApp:
         ttk.Button(control_frame, text="Reset Zoom", command=self.reset_zoom).pack(side=tk.LEFT, padx=(2, 5))
         ttk.Button(control_frame, text="Fit to Window", command=self.fit_to_window).pack(side=tk.LEFT, padx=(2, 5))
         
+        # Search bar
+        search_frame = ttk.Frame(main_frame)
+        search_frame.pack(fill=tk.X, pady=(0, 10))
+        
+        ttk.Label(search_frame, text="Search:").pack(side=tk.LEFT, padx=(0, 5))
+        self.search_var = tk.StringVar()
+        search_entry = ttk.Entry(search_frame, textvariable=self.search_var, width=30)
+        search_entry.pack(side=tk.LEFT, padx=(0, 5))
+        search_entry.bind('<Return>', lambda e: self.run_search())
+        ttk.Button(search_frame, text="Find", command=self.run_search).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(search_frame, text="Previous Hit", command=self.prev_hit).pack(side=tk.LEFT, padx=(5, 2))
+        ttk.Button(search_frame, text="Next Hit", command=self.next_hit).pack(side=tk.LEFT, padx=(2, 5))
+        self.search_status_var = tk.StringVar()
+        ttk.Label(search_frame, textvariable=self.search_status_var).pack(side=tk.LEFT, padx=(10, 0))
+        
         # Content frame
         content_frame = ttk.Frame(main_frame)
         content_frame.pack(fill=tk.BOTH, expand=True)
         
+        # Thumbnail sidebar
+        thumb_frame = ttk.Frame(content_frame)
+        thumb_frame.pack(side=tk.LEFT, fill=tk.Y, padx=(0, 10))
+        
+        self.thumb_canvas = tk.Canvas(thumb_frame, bg='gray85', highlightthickness=0,
+                                      width=THUMBNAIL_SIZE[0] + 2 * THUMBNAIL_PADDING)
+        self.thumb_scrollbar = ttk.Scrollbar(thumb_frame, orient=tk.VERTICAL, command=self.thumb_canvas.yview)
+        self.thumb_canvas.configure(yscrollcommand=self.on_thumb_scroll)
+        self.thumb_canvas.pack(side=tk.LEFT, fill=tk.Y)
+        self.thumb_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
         # Left panel for PDF display
         left_frame = ttk.Frame(content_frame)
         left_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(0, 10))
@@ -64,12 +768,18 @@ class PDFViewerApp:
         self.canvas = tk.Canvas(canvas_frame, bg='white')
         v_scrollbar = ttk.Scrollbar(canvas_frame, orient=tk.VERTICAL, command=self.canvas.yview)
         h_scrollbar = ttk.Scrollbar(canvas_frame, orient=tk.HORIZONTAL, command=self.canvas.xview)
-        self.canvas.configure(yscrollcommand=v_scrollbar.set, xscrollcommand=h_scrollbar.set)
+        self.v_scrollbar = v_scrollbar
+        self.h_scrollbar = h_scrollbar
+        self.canvas.configure(yscrollcommand=self.on_yscroll, xscrollcommand=self.on_xscroll)
         
         self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         v_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         h_scrollbar.pack(side=tk.BOTTOM, fill=tk.X)
         
+        # Render statistics
+        self.stats_var = tk.StringVar(value="Renders: 0")
+        ttk.Label(left_frame, textvariable=self.stats_var).pack(anchor=tk.W, pady=(5, 0))
+        
         # Right panel for rectangle controls
         right_frame = ttk.LabelFrame(content_frame, text="Rectangle Controls", padding=10)
         right_frame.pack(side=tk.RIGHT, fill=tk.Y, padx=(10, 0))
@@ -111,32 +821,43 @@ class PDFViewerApp:
                                   values=["red", "blue", "green", "yellow", "orange", "purple", "black"],
                                   state="readonly", width=12)
         color_combo.pack(anchor=tk.W, pady=(0, 5))
+        color_combo.bind('<<ComboboxSelected>>', lambda e: self.update_overlay())
         
         # Rectangle opacity
         ttk.Label(right_frame, text="Opacity:").pack(anchor=tk.W, pady=(10, 5))
         self.opacity_var = tk.DoubleVar(value=0.3)
         opacity_scale = ttk.Scale(right_frame, from_=0.1, to=1.0, variable=self.opacity_var, 
-                                 orient=tk.HORIZONTAL, length=150)
+                                 orient=tk.HORIZONTAL, length=150,
+                                 command=lambda value: self.update_overlay())
         opacity_scale.pack(anchor=tk.W, pady=(0, 5))
         
         # Update button
-        ttk.Button(right_frame, text="Update Rectangle", command=self.update_display).pack(pady=(10, 5))
+        ttk.Button(right_frame, text="Update Rectangle",
+                   command=lambda: self.update_overlay(show_error=True)).pack(pady=(10, 5))
         
         # Show/Hide rectangle
         self.show_rect_var = tk.BooleanVar(value=True)
         ttk.Checkbutton(right_frame, text="Show Rectangle", variable=self.show_rect_var,
-                       command=self.update_display).pack(pady=(5, 0))
+                       command=self.update_overlay).pack(pady=(5, 0))
         
         # Show page border
         self.show_border_var = tk.BooleanVar(value=True)
         ttk.Checkbutton(right_frame, text="Show Page Border", variable=self.show_border_var,
-                       command=self.update_display).pack(pady=(5, 0))
+                       command=self.update_overlay).pack(pady=(5, 0))
         
         # Rectangle info
         ttk.Label(right_frame, text="Rectangle Info:").pack(anchor=tk.W, pady=(20, 5))
         self.info_text = tk.Text(right_frame, height=4, width=20, wrap=tk.WORD)
         self.info_text.pack(anchor=tk.W, pady=(0, 5))
         
+        # Rectangle layer, many rectangles per page from text or JSON
+        layer_frame = ttk.LabelFrame(right_frame, text="Rectangle Layer", padding=5)
+        layer_frame.pack(fill=tk.X, pady=(10, 0))
+        ttk.Button(layer_frame, text="Load Words", command=lambda: self.load_text_layer("words")).pack(fill=tk.X)
+        ttk.Button(layer_frame, text="Load Blocks", command=lambda: self.load_text_layer("blocks")).pack(fill=tk.X, pady=(2, 0))
+        ttk.Button(layer_frame, text="Load JSON", command=self.load_json_layer).pack(fill=tk.X, pady=(2, 0))
+        ttk.Button(layer_frame, text="Clear Layer", command=self.clear_rect_layer).pack(fill=tk.X, pady=(2, 0))
+        
         # Bind events
         self.bind_events()
         
@@ -151,6 +872,21 @@ class PDFViewerApp:
         self.canvas.bind('<Button-4>', self.on_mousewheel)
         self.canvas.bind('<Button-5>', self.on_mousewheel)
         
+        # Bind mouse drag to draw or move the rectangle
+        self.canvas.bind('<ButtonPress-1>', self.on_drag_start)
+        self.canvas.bind('<B1-Motion>', self.on_drag_motion)
+        self.canvas.bind('<ButtonRelease-1>', self.on_drag_end)
+        
+        # Bind mouse motion for hit-testing the rectangle layer
+        self.canvas.bind('<Motion>', self.on_mouse_motion)
+        
+        # Thumbnail sidebar navigation and scrolling
+        self.thumb_canvas.bind('<Button-1>', self.on_thumbnail_click)
+        self.thumb_canvas.bind('<MouseWheel>', self.on_thumb_mousewheel)
+        self.thumb_canvas.bind('<Button-4>', self.on_thumb_mousewheel)
+        self.thumb_canvas.bind('<Button-5>', self.on_thumb_mousewheel)
+        self.thumb_canvas.bind('<Configure>', lambda e: self.schedule_thumbnail_refresh())
+        
         # Bind canvas resize to maintain fit-to-window
         self.canvas.bind('<Configure>', self.on_canvas_resize)
         
@@ -158,7 +894,38 @@ class PDFViewerApp:
         # Only update if fit-to-window is enabled and we have a document
         if self.fit_to_window and self.pdf_document:
             self.calculate_fit_zoom()
-            self.update_display()
+            self.show_resize_preview()
+            
+            # Restart the timer on every event so only the last one renders
+            if self.resize_job is not None:
+                self.root.after_cancel(self.resize_job)
+            self.resize_job = self.root.after(RESIZE_SETTLE_MS, self.update_display)
+        else:
+            self.schedule_view_refresh()
+    
+    def show_resize_preview(self):
+        # Scale the last full render instead of asking MuPDF for a new one
+        if self.tiled or self.display_image is None:
+            return
+        
+        page = self.pdf_document[self.current_page]
+        page_irect = (page.rect * fitz.Matrix(self.zoom_factor, self.zoom_factor)).irect
+        if page_irect.width <= 0 or page_irect.height <= 0:
+            return
+        
+        preview = self.display_image.resize((page_irect.width, page_irect.height), Image.Resampling.NEAREST)
+        self.photo = ImageTk.PhotoImage(preview)
+        self.canvas.itemconfigure("page", image=self.photo)
+        self.canvas.configure(scrollregion=(0, 0, page_irect.width, page_irect.height))
+        self.update_overlay()
+        
+        self.preview_count += 1
+        self.update_render_stats()
+    
+    def update_render_stats(self):
+        average_ms = self.total_render_ms / self.render_count if self.render_count else 0.0
+        self.stats_var.set(f"Renders: {self.render_count} (previews: {self.preview_count}) | "
+                           f"last {self.last_render_ms:.1f} ms | avg {average_ms:.1f} ms")
         
     def on_mousewheel(self, event):
         # Zoom with mouse wheel while holding Ctrl
@@ -179,12 +946,26 @@ class PDFViewerApp:
         
         if file_path:
             try:
+                self.rect_layers.clear()
+                self.thumb_loader.cancel()
+                self.thumb_photos.clear()
+                if self.doc_key is not None:
+                    self.prefetcher.cancel()
+                    self.page_cache.discard_document(self.doc_key)
+                    self.display_lists.discard_document(self.doc_key)
+                # The file may have been edited since it was indexed
+                self.text_indexer.cancel()
+                self.text_indexes.pop(file_path, None)
                 self.pdf_document = fitz.open(file_path)
+                self.doc_key = file_path
                 self.total_pages = len(self.pdf_document)
                 self.current_page = 0
+                self.search_hits = []
+                self.search_hit = None
                 self.update_page_info()
                 self.calculate_fit_zoom()
                 self.update_display()
+                self.start_text_index()
                 messagebox.showinfo("Success", f"PDF loaded successfully!\nTotal pages: {self.total_pages}")
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to open PDF: {str(e)}")
@@ -210,6 +991,92 @@ class PDFViewerApp:
             self.page_var.set(f"{self.current_page + 1} / {self.total_pages}")
         else:
             self.page_var.set("No PDF loaded")
+        self.schedule_thumbnail_refresh()
+    
+    def go_to_page(self, page_index):
+        if self.pdf_document and 0 <= page_index < self.total_pages and page_index != self.current_page:
+            self.current_page = page_index
+            self.update_page_info()
+            if self.fit_to_window:
+                self.calculate_fit_zoom()
+            self.update_display()
+    
+    def on_thumb_scroll(self, first, last):
+        # Tk reports the view after every redraw, only an actual scroll needs a refresh
+        if (first, last) == self.thumb_view:
+            return
+        self.thumb_view = (first, last)
+        self.thumb_scrollbar.set(first, last)
+        self.schedule_thumbnail_refresh()
+    
+    def on_thumb_mousewheel(self, event):
+        if event.num == 4:
+            delta = -1
+        elif event.num == 5:
+            delta = 1
+        else:
+            delta = int(-1 * (event.delta / 120))
+        self.thumb_canvas.yview_scroll(delta, "units")
+    
+    def on_thumbnail_click(self, event):
+        slot_height = THUMBNAIL_SIZE[1] + THUMBNAIL_PADDING
+        self.go_to_page(int(self.thumb_canvas.canvasy(event.y) // slot_height))
+    
+    def schedule_thumbnail_refresh(self):
+        if not self.thumb_refresh_pending:
+            self.thumb_refresh_pending = True
+            self.root.after_idle(self.update_thumbnails)
+    
+    def set_thumb_scrollregion(self, region):
+        # Reconfiguring makes Tk report the view again, so only do it when the page count changed
+        if region == self.thumb_scrollregion:
+            return
+        self.thumb_scrollregion = region
+        self.thumb_canvas.configure(scrollregion=region,
+                                    yscrollincrement=(THUMBNAIL_SIZE[1] + THUMBNAIL_PADDING) // 4)
+    
+    def update_thumbnails(self):
+        self.thumb_refresh_pending = False
+        self.thumb_canvas.delete("all")
+        if not self.pdf_document:
+            self.set_thumb_scrollregion((0, 0, 0, 0))
+            return
+        
+        width, height = THUMBNAIL_SIZE
+        slot_height = height + THUMBNAIL_PADDING
+        self.set_thumb_scrollregion((0, 0, width + 2 * THUMBNAIL_PADDING,
+                                     self.total_pages * slot_height + THUMBNAIL_PADDING))
+        
+        # Work out which slots are in view, nothing else is drawn or rendered
+        top = self.thumb_canvas.canvasy(0)
+        bottom = top + self.thumb_canvas.winfo_height()
+        first = max(0, int(top // slot_height))
+        last = min(self.total_pages - 1, int(bottom // slot_height))
+        visible = range(first, last + 1)
+        
+        for page_index in [p for p in self.thumb_photos if p not in visible]:
+            del self.thumb_photos[page_index]
+        
+        for page_index in visible:
+            x, y = THUMBNAIL_PADDING, page_index * slot_height + THUMBNAIL_PADDING
+            photo = self.thumb_photos.get(page_index)
+            if photo is not None:
+                self.thumb_canvas.create_image(x + width // 2, y, anchor=tk.N, image=photo)
+            else:
+                self.thumb_canvas.create_rectangle(x, y, x + width, y + height, fill='white', outline='gray60')
+            self.thumb_canvas.create_text(x + 4, y + height - 4, anchor=tk.SW, text=str(page_index + 1))
+            if page_index == self.current_page:
+                self.thumb_canvas.create_rectangle(x - 3, y - 3, x + width + 3, y + height + 3,
+                                                   outline='blue', width=2)
+        
+        self.thumb_loader.request(self.doc_key, [p for p in visible if p not in self.thumb_photos])
+    
+    def on_thumbnail_loaded(self, path, page_index, image):
+        # Late results for another document or a slot that scrolled away are ignored
+        if path != self.doc_key:
+            return
+        self.thumb_photos[page_index] = ImageTk.PhotoImage(image)
+        self.schedule_thumbnail_refresh()
     
     def zoom_in(self):
         self.fit_to_window = False
@@ -237,6 +1104,11 @@ class PDFViewerApp:
         
         # Get current page dimensions
         page = self.pdf_document[self.current_page]
+        zoom = self.get_fit_zoom(page)
+        if zoom is not None:
+            self.zoom_factor = zoom
+    
+    def get_fit_zoom(self, page):
         page_rect = page.rect
         
         # Get canvas dimensions (subtract some padding)
@@ -249,7 +1121,8 @@ class PDFViewerApp:
             zoom_height = canvas_height / page_rect.height
             
             # Use the smaller zoom factor to fit within both dimensions
-            self.zoom_factor = min(zoom_width, zoom_height)
+            return min(zoom_width, zoom_height)
+        return None
     
     def set_page_rect(self):
         if not self.pdf_document:
@@ -266,9 +1139,10 @@ class PDFViewerApp:
         self.y1_var.set(f"{page_rect.y1:.1f}")
         
         # Update display
-        self.update_display()
+        self.update_overlay()
     
-    def get_rect_coordinates(self):
+    def get_rect_coordinates(self, show_error=False):
+        # Live redraws pass show_error=False, a half-typed entry is not worth a dialog each time
         try:
             x0 = float(self.x0_var.get())
             y0 = float(self.y0_var.get())
@@ -276,13 +1150,31 @@ class PDFViewerApp:
             y1 = float(self.y1_var.get())
             return fitz.Rect(x0, y0, x1, y1)
         except ValueError:
-            messagebox.showerror("Error", "Please enter valid numeric coordinates")
+            if show_error:
+                messagebox.showerror("Error", "Please enter valid numeric coordinates")
             return None
     
+    def get_page_image(self, page, mat):
+        # Rendering is the expensive part, so reuse the raster whenever
+        # only the overlay changed
+        key = (self.doc_key, page.number, round(self.zoom_factor, 4))
+        pil_image = self.page_cache.get(key) or self.prefetcher.wait_for(key)
+        if pil_image is None:
+            # Render page from its cached display list
+            display_list = self.display_lists.get(self.doc_key, page)
+            pil_image = render_page_image(display_list, mat)
+            self.page_cache.put(key, pil_image)
+        return pil_image
+    
     def update_display(self):
+        if self.resize_job is not None:
+            self.root.after_cancel(self.resize_job)
+            self.resize_job = None
+        
         if not self.pdf_document:
             return
         
+        start_time = time.perf_counter()
         try:
             # Get current page
             page = self.pdf_document[self.current_page]
@@ -290,83 +1182,439 @@ class PDFViewerApp:
             # Create matrix for zoom
             mat = fitz.Matrix(self.zoom_factor, self.zoom_factor)
             
-            # Render page to pixmap
-            pix = page.get_pixmap(matrix=mat)
-            
-            # Convert to PIL Image
-            img_data = pix.tobytes("ppm")
-            pil_image = Image.open(io.BytesIO(img_data))
-            
-            # Convert to RGBA for transparency support
-            pil_image = pil_image.convert('RGBA')
+            # Update canvas
+            self.canvas.delete("all")
+            self.photo = None
+            self.display_image = None
+            self.tile_items.clear()
+            self.tile_queue.clear()
             
-            # Draw page border if enabled
-            if self.show_border_var.get():
-                page_rect = page.rect
-                scaled_page_rect = page_rect * mat
+            page_irect = (page.rect * mat).irect
+            self.tiled = page_irect.width * page_irect.height > TILED_RENDER_THRESHOLD
+            if self.tiled:
+                # Only the tiles in view get rendered, see update_tiles
+                self.canvas.configure(scrollregion=(0, 0, page_irect.width, page_irect.height))
+                self.update_tiles()
+            else:
+                # Convert the rendered page to PhotoImage
+                pil_image = self.get_page_image(page, mat)
+                self.display_image = pil_image
+                self.photo = ImageTk.PhotoImage(pil_image)
+                self.canvas.create_image(0, 0, anchor=tk.NW, image=self.photo, tags="page")
                 
-                draw = ImageDraw.Draw(pil_image)
-                draw.rectangle(
-                    [scaled_page_rect.x0, scaled_page_rect.y0, scaled_page_rect.x1-1, scaled_page_rect.y1-1],
-                    outline=(0, 0, 0, 255),
-                    width=2
-                )
+                # Update scroll region
+                self.canvas.configure(scrollregion=(0, 0, pil_image.width, pil_image.height))
             
-            # Draw rectangle if enabled
-            if self.show_rect_var.get():
-                rect = self.get_rect_coordinates()
-                if rect:
-                    # Scale rectangle coordinates according to zoom
-                    scaled_rect = rect * mat
-                    
-                    # Get color and opacity
-                    color = self.color_var.get()
-                    opacity = int(self.opacity_var.get() * 255)
-                    
-                    # Color mapping
-                    color_map = {
-                        "red": (255, 0, 0, opacity),
-                        "blue": (0, 0, 255, opacity),
-                        "green": (0, 255, 0, opacity),
-                        "yellow": (255, 255, 0, opacity),
-                        "orange": (255, 165, 0, opacity),
-                        "purple": (128, 0, 128, opacity),
-                        "black": (0, 0, 0, opacity)
-                    }
-                    
-                    # Create overlay for transparency
-                    overlay = Image.new('RGBA', pil_image.size, (0, 0, 0, 0))
-                    overlay_draw = ImageDraw.Draw(overlay)
-                    
-                    # Draw rectangle
-                    overlay_draw.rectangle(
-                        [scaled_rect.x0, scaled_rect.y0, scaled_rect.x1, scaled_rect.y1],
-                        fill=color_map.get(color, (255, 0, 0, opacity)),
-                        outline=color_map.get(color, (255, 0, 0, 255))[:3] + (255,),
-                        width=2
-                    )
-                    
-                    # Composite overlay onto image
-                    pil_image = Image.alpha_composite(pil_image, overlay)
-                    
-                    # Update rectangle info
-                    self.update_rect_info(rect, page)
-            
-            # Convert back to RGB for display
-            pil_image = pil_image.convert('RGB')
-            
-            # Convert to PhotoImage
-            self.photo = ImageTk.PhotoImage(pil_image)
-            
-            # Update canvas
-            self.canvas.delete("all")
-            self.canvas.create_image(0, 0, anchor=tk.NW, image=self.photo)
+            # Overlays are separate canvas items on top of the page raster
+            self.update_rect_layer()
+            self.draw_search_hits()
+            self.update_overlay()
             
-            # Update scroll region
-            self.canvas.configure(scrollregion=self.canvas.bbox("all"))
+            # Get the neighbouring pages ready while the user looks at this one
+            self.schedule_prefetch()
             
         except Exception as e:
             messagebox.showerror("Error", f"Failed to update display: {str(e)}")
+        
+        self.render_count += 1
+        self.last_render_ms = (time.perf_counter() - start_time) * 1000
+        self.total_render_ms += self.last_render_ms
+        self.update_render_stats()
+    
+    def schedule_prefetch(self):
+        requests = []
+        for distance in range(1, self.prefetch_distance + 1):
+            for page_index in (self.current_page + distance, self.current_page - distance):
+                if not 0 <= page_index < self.total_pages:
+                    continue
+                
+                # Neighbours are shown at the zoom they will get when flipped to
+                page = self.pdf_document[page_index]
+                zoom = (self.get_fit_zoom(page) if self.fit_to_window else None) or self.zoom_factor
+                page_irect = (page.rect * fitz.Matrix(zoom, zoom)).irect
+                if page_irect.width * page_irect.height <= TILED_RENDER_THRESHOLD:
+                    requests.append((page_index, zoom))
+        
+        self.prefetcher.prefetch(self.doc_key, self.doc_key, requests)
+    
+    def on_xscroll(self, first, last):
+        self.h_scrollbar.set(first, last)
+        self.schedule_view_refresh()
+    
+    def on_yscroll(self, first, last):
+        self.v_scrollbar.set(first, last)
+        self.schedule_view_refresh()
+    
+    def schedule_view_refresh(self):
+        # The view can change several times per event, refresh once when idle
+        if (self.tiled or self.rect_layers) and not self.view_refresh_pending:
+            self.view_refresh_pending = True
+            self.root.after_idle(self.refresh_view)
+    
+    def refresh_view(self):
+        self.view_refresh_pending = False
+        self.update_tiles()
+        self.update_rect_layer()
+    
+    def get_tile_image(self, page, mat, column, row):
+        key = (self.doc_key, page.number, round(self.zoom_factor, 4), column, row)
+        pil_image = self.page_cache.get(key)
+        if pil_image is None:
+            # Render only this tile's part of the page
+            display_list = self.display_lists.get(self.doc_key, page)
+            pil_image = render_page_image(display_list, mat, tile_clip(mat, column, row))
+            self.page_cache.put(key, pil_image)
+        return pil_image
+    
+    def visible_tiles(self, page_irect):
+        # Tiles intersecting the current scroll viewport
+        return viewport_tiles(page_irect, self.canvas.canvasx(0), self.canvas.canvasy(0),
+                              self.canvas.winfo_width(), self.canvas.winfo_height())
+    
+    def update_tiles(self):
+        if not self.tiled or not self.pdf_document:
+            return
+        
+        page = self.pdf_document[self.current_page]
+        mat = fitz.Matrix(self.zoom_factor, self.zoom_factor)
+        visible = set(self.visible_tiles((page.rect * mat).irect))
+        
+        # Drop tiles that scrolled out of view so memory follows the viewport
+        for tile in [t for t in self.tile_items if t not in visible]:
+            self.canvas.delete(self.tile_items.pop(tile)[0])
+        
+        # Queue the missing tiles, filled in one at a time so scrolling stays responsive
+        self.tile_queue = [t for t in sorted(visible, key=lambda t: (t[1], t[0])) if t not in self.tile_items]
+        if self.tile_queue and self.tile_job is None:
+            self.tile_job = self.root.after(1, self.render_next_tile)
+    
+    def render_next_tile(self):
+        self.tile_job = None
+        if not self.tile_queue or not self.pdf_document:
+            return
+        
+        column, row = self.tile_queue.pop(0)
+        page = self.pdf_document[self.current_page]
+        mat = fitz.Matrix(self.zoom_factor, self.zoom_factor)
+        try:
+            pil_image = self.get_tile_image(page, mat, column, row)
+        except Exception as e:
+            self.tile_queue.clear()
+            messagebox.showerror("Error", f"Failed to render tile: {str(e)}")
+            return
+        
+        photo = ImageTk.PhotoImage(pil_image)
+        item = self.canvas.create_image(column * TILE_SIZE, row * TILE_SIZE, anchor=tk.NW,
+                                        image=photo, tags=("page", "tile"))
+        self.canvas.tag_lower(item)
+        self.tile_items[(column, row)] = (item, photo)
+        
+        if self.tile_queue:
+            self.tile_job = self.root.after(1, self.render_next_tile)
+    
+    def start_text_index(self):
+        index = self.text_indexes.get(self.doc_key)
+        if index is None:
+            index = self.text_indexes[self.doc_key] = TextIndex(self.total_pages)
+            while len(self.text_indexes) > MAX_TEXT_INDEXES:
+                self.text_indexes.popitem(last=False)
+        self.text_indexes.move_to_end(self.doc_key)
+        
+        if index.complete:
+            self.search_status_var.set("")
+        else:
+            self.text_indexer.build(self.doc_key, index)
+    
+    def on_index_progress(self, path, index):
+        if path != self.doc_key or index is not self.text_indexes.get(path) or self.search_hits:
+            return
+        if index.complete:
+            self.search_status_var.set("Index ready")
+        else:
+            self.search_status_var.set(f"Indexing {len(index.pages)} / {index.page_count}")
+    
+    def run_search(self):
+        index = self.text_indexes.get(self.doc_key)
+        if not self.pdf_document or index is None:
+            return
+        
+        start_time = time.perf_counter()
+        self.search_hits = index.search(self.search_var.get())
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+        
+        # Start from the first hit at or after the current page
+        self.search_hit = None
+        for i, (page_index, rect) in enumerate(self.search_hits):
+            if page_index >= self.current_page:
+                self.search_hit = i
+                break
+        if self.search_hit is None and self.search_hits:
+            self.search_hit = 0
+        
+        note = "" if index.complete else f" (indexed {len(index.pages)} / {index.page_count} pages)"
+        if not self.search_hits:
+            self.search_status_var.set(f"No hits{note}")
+            self.draw_search_hits()
+            return
+        self.show_search_hit()
+        self.search_status_var.set(self.search_status_var.get() + f" in {elapsed_ms:.1f} ms{note}")
+    
+    def next_hit(self):
+        if self.search_hits:
+            self.search_hit = (self.search_hit + 1) % len(self.search_hits)
+            self.show_search_hit()
+    
+    def prev_hit(self):
+        if self.search_hits:
+            self.search_hit = (self.search_hit - 1) % len(self.search_hits)
+            self.show_search_hit()
+    
+    def show_search_hit(self):
+        page_index, rect = self.search_hits[self.search_hit]
+        self.search_status_var.set(f"Hit {self.search_hit + 1} / {len(self.search_hits)}")
+        if page_index != self.current_page:
+            self.go_to_page(page_index)
+        else:
+            self.draw_search_hits()
+        
+        # Scroll so the hit is in view
+        left, top, right, bottom = (float(v) for v in self.canvas.cget("scrollregion").split())
+        if right > 0 and bottom > 0:
+            scaled = fitz.Rect(rect) * fitz.Matrix(self.zoom_factor, self.zoom_factor)
+            self.canvas.xview_moveto(max(0.0, (scaled.x0 - self.canvas.winfo_width() / 2) / right))
+            self.canvas.yview_moveto(max(0.0, (scaled.y0 - self.canvas.winfo_height() / 2) / bottom))
+    
+    def create_translucent_rect(self, x0, y0, x1, y1, color, opacity, photos, tags, **options):
+        """Rectangle with a see-through fill, returns the rectangle item.
+
+        On X11 the fill is a stipple. Other windowing systems get a
+        semi-transparent image under an unfilled rectangle; the image is
+        tagged "fill" as well and kept alive in photos.
+        """
+        if self.stipple_supported or opacity >= 0.9:
+            return self.canvas.create_rectangle(x0, y0, x1, y1, fill=rgb_to_hex(color),
+                                                stipple=opacity_stipple(opacity), tags=tags, **options)
+        # Only the part on the page is filled, a rectangle far outside it would need a huge image
+        page_rect = self.pdf_document[self.current_page].rect * self.zoom_factor
+        fill_x0, fill_y0 = max(x0, page_rect.x0), max(y0, page_rect.y0)
+        width = round(min(x1, page_rect.x1) - fill_x0)
+        height = round(min(y1, page_rect.y1) - fill_y0)
+        if width > 0 and height > 0:
+            photo = ImageTk.PhotoImage(Image.new("RGBA", (width, height), color + (round(opacity * 255),)))
+            photos.append(photo)
+            self.canvas.create_image(fill_x0, fill_y0, anchor=tk.NW, image=photo, tags=tags + ("fill",))
+        return self.canvas.create_rectangle(x0, y0, x1, y1, tags=tags, **options)
+    
+    def draw_search_hits(self):
+        self.canvas.delete("search")
+        self.search_photos = []
+        zoom = self.zoom_factor
+        for i, (page_index, rect) in enumerate(self.search_hits):
+            if page_index != self.current_page:
+                continue
+            x0, y0, x1, y1 = rect
+            color = CURRENT_HIT_COLOR if i == self.search_hit else SEARCH_HIT_COLOR
+            self.create_translucent_rect(x0 * zoom, y0 * zoom, x1 * zoom, y1 * zoom, color, 0.5, self.search_photos,
+                                         ("search",), outline=rgb_to_hex(CURRENT_HIT_COLOR),
+                                         width=2 if i == self.search_hit else 1)
+        self.canvas.tag_raise("overlay")
+    
+    def load_text_layer(self, kind):
+        if not self.pdf_document:
+            messagebox.showwarning("Warning", "Please load a PDF first")
+            return
+        
+        # get_text tuples start with the bbox followed by the text
+        entries = self.pdf_document[self.current_page].get_text(kind)
+        rects = [entry[:4] for entry in entries]
+        labels = [str(entry[4]).strip() for entry in entries]
+        self.rect_layers[self.current_page] = RectIndex(rects, labels)
+        self.update_rect_layer()
+    
+    def load_json_layer(self):
+        if not self.pdf_document:
+            messagebox.showwarning("Warning", "Please load a PDF first")
+            return
+        
+        file_path = filedialog.askopenfilename(
+            title="Select rectangle JSON file",
+            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+        )
+        if not file_path:
+            return
+        
+        try:
+            pages = load_rect_manifest(file_path, self.current_page)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to load rectangles: {str(e)}")
+            return
+        
+        for page_index, (rects, labels) in pages.items():
+            self.rect_layers[page_index] = RectIndex(rects, labels)
+        self.update_rect_layer()
+    
+    def clear_rect_layer(self):
+        self.rect_layers.clear()
+        self.update_rect_layer()
+    
+    def viewport_rect(self):
+        # The visible part of the page in PDF coordinates
+        left, top = self.canvas.canvasx(0), self.canvas.canvasy(0)
+        right = left + self.canvas.winfo_width()
+        bottom = top + self.canvas.winfo_height()
+        return fitz.Rect(left, top, right, bottom) * (1 / self.zoom_factor)
+    
+    def update_rect_layer(self):
+        self.canvas.delete("layer")
+        self.canvas.delete("hit")
+        self.layer_photo = None
+        self.hover_hit = None
+        
+        index = self.rect_layers.get(self.current_page)
+        if not self.pdf_document or index is None:
+            return
+        
+        # Only rectangles in the viewport get drawn
+        view = self.viewport_rect()
+        visible = index.query(view.x0, view.y0, view.x1, view.y1)
+        zoom = self.zoom_factor
+        
+        if len(visible) <= MAX_LAYER_ITEMS:
+            color = rgb_to_hex(LAYER_COLOR)
+            for i in visible:
+                x0, y0, x1, y1 = index.rects[i]
+                self.canvas.create_rectangle(x0 * zoom, y0 * zoom, x1 * zoom, y1 * zoom,
+                                             outline=color, tags="layer")
+        else:
+            # Too many items for the canvas, draw them into a single viewport-sized image
+            left, top = self.canvas.canvasx(0), self.canvas.canvasy(0)
+            image = Image.new("RGBA", (max(1, self.canvas.winfo_width()), max(1, self.canvas.winfo_height())))
+            draw = ImageDraw.Draw(image)
+            for i in visible:
+                x0, y0, x1, y1 = index.rects[i]
+                draw.rectangle([x0 * zoom - left, y0 * zoom - top, x1 * zoom - left, y1 * zoom - top],
+                               outline=LAYER_COLOR + (255,))
+            self.layer_photo = ImageTk.PhotoImage(image)
+            self.canvas.create_image(left, top, anchor=tk.NW, image=self.layer_photo, tags="layer")
+        
+        self.canvas.tag_raise("overlay")
+    
+    def on_mouse_motion(self, event):
+        index = self.rect_layers.get(self.current_page)
+        if index is None or self.drag_state is not None:
+            return
+        
+        zoom = self.zoom_factor
+        hits = index.query_point(self.canvas.canvasx(event.x) / zoom, self.canvas.canvasy(event.y) / zoom)
+        hit = hits[0] if hits else None
+        if hit == self.hover_hit:
+            return
+        self.hover_hit = hit
+        
+        # Highlight the innermost rectangle under the pointer
+        self.canvas.delete("hit")
+        if hit is None:
+            return
+        x0, y0, x1, y1 = index.rects[hit]
+        self.canvas.create_rectangle(x0 * zoom, y0 * zoom, x1 * zoom, y1 * zoom,
+                                     outline=rgb_to_hex(HIT_COLOR), width=2, tags="hit")
+        
+        info = f"Layer #{hit}: {index.labels[hit]}\n"
+        info += f"({x0:.1f}, {y0:.1f}, {x1:.1f}, {y1:.1f})"
+        self.info_text.delete(1.0, tk.END)
+        self.info_text.insert(1.0, info)
+    
+    def update_overlay(self, show_error=False):
+        if not self.pdf_document:
+            return
+        
+        page = self.pdf_document[self.current_page]
+        mat = fitz.Matrix(self.zoom_factor, self.zoom_factor)
+        
+        self.canvas.delete("overlay")
+        self.rect_item = None
+        self.rect_photos = []
+        
+        # Draw page border if enabled
+        if self.show_border_var.get():
+            scaled_page_rect = page.rect * mat
+            self.canvas.create_rectangle(
+                scaled_page_rect.x0, scaled_page_rect.y0, scaled_page_rect.x1 - 1, scaled_page_rect.y1 - 1,
+                outline="black", width=2, tags=("overlay", "border")
+            )
+        
+        # Draw rectangle if enabled
+        if self.show_rect_var.get():
+            rect = self.get_rect_coordinates(show_error)
+            if rect:
+                # Scale rectangle coordinates according to zoom, ordered so the fill image has a positive size
+                scaled_rect = fitz.Rect(rect).normalize() * mat
+                color = COLOR_MAP.get(self.color_var.get(), COLOR_MAP["red"])
+                
+                self.rect_item = self.create_translucent_rect(
+                    scaled_rect.x0, scaled_rect.y0, scaled_rect.x1, scaled_rect.y1,
+                    color, self.opacity_var.get(), self.rect_photos, ("overlay", "rect"),
+                    outline=rgb_to_hex(color), width=2
+                )
+                
+                # Update rectangle info
+                self.update_rect_info(rect, page)
+    
+    def on_drag_start(self, event):
+        if not self.pdf_document or not self.show_rect_var.get():
+            return
+        
+        x, y = self.canvas.canvasx(event.x), self.canvas.canvasy(event.y)
+        if self.rect_item is not None:
+            x0, y0, x1, y1 = self.canvas.coords(self.rect_item)
+            if x0 <= x <= x1 and y0 <= y <= y1:
+                # Grab the existing rectangle and move it
+                self.drag_state = ("move", x, y)
+                return
+        
+        # Otherwise start drawing a new rectangle from the pointer
+        if self.rect_item is None:
+            self.update_overlay()
+        if self.rect_item is not None:
+            # Only the outline follows the pointer, the fill is redrawn on release
+            self.canvas.delete("rect&&fill")
+            self.canvas.coords(self.rect_item, x, y, x, y)
+            self.drag_state = ("draw", x, y)
+    
+    def on_drag_motion(self, event):
+        if self.drag_state is None or self.rect_item is None:
+            return
+        
+        mode, start_x, start_y = self.drag_state
+        x, y = self.canvas.canvasx(event.x), self.canvas.canvasy(event.y)
+        
+        # Only the item coordinates change while dragging
+        if mode == "move":
+            self.canvas.move("rect", x - start_x, y - start_y)
+            self.drag_state = ("move", x, y)
+        else:
+            self.canvas.coords(self.rect_item, min(start_x, x), min(start_y, y), max(start_x, x), max(start_y, y))
+    
+    def on_drag_end(self, event):
+        if self.drag_state is None or self.rect_item is None:
+            self.drag_state = None
+            return
+        mode = self.drag_state[0]
+        self.drag_state = None
+        
+        x0, y0, x1, y1 = self.canvas.coords(self.rect_item)
+        if mode == "draw" and (x1 - x0 < MIN_DRAW_PIXELS or y1 - y0 < MIN_DRAW_PIXELS):
+            # Just a click, put the previous rectangle back
+            self.update_overlay()
+            return
+        
+        # Write the new position back to the inputs in PDF coordinates, then redraw from them
+        x0, y0, x1, y1 = (value / self.zoom_factor for value in (x0, y0, x1, y1))
+        self.x0_var.set(f"{x0:.1f}")
+        self.y0_var.set(f"{y0:.1f}")
+        self.x1_var.set(f"{x1:.1f}")
+        self.y1_var.set(f"{y1:.1f}")
+        self.update_overlay()
     
     def update_rect_info(self, rect, page):
         info = f"Rect: ({rect.x0:.1f}, {rect.y0:.1f}, {rect.x1:.1f}, {rect.y1:.1f})\n"
@@ -378,6 +1626,7 @@ class PDFViewerApp:
         self.info_text.insert(1.0, info)
 
 def main():
+    multiprocessing.freeze_support()
     root = tk.Tk()
     app = PDFViewerApp(root)
     root.mainloop()
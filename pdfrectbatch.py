@@ -0,0 +1,157 @@
+import argparse
+import json
+import multiprocessing
+import os
+import pathlib
+import sys
+import time
+import pymupdf as fitz
+
+from pdfrect import COLOR_MAP, draw_overlay, open_worker_document, parse_rect_entries, pixmap_to_image
+
+
+def parse_rect(value):
+    try:
+        x0, y0, x1, y1 = (float(v) for v in value.split(","))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected x0,y0,x1,y1, got {value!r}")
+    return (x0, y0, x1, y1)
+
+
+def find_pdfs(inputs):
+    # Yields (pdf, output subdirectory), PDFs found in a directory keep their path below it
+    for name in inputs:
+        path = pathlib.Path(name)
+        if path.is_dir():
+            for pdf in sorted(p for p in path.rglob("*") if p.suffix.lower() == ".pdf"):
+                yield pdf, pdf.relative_to(path).with_suffix("")
+        else:
+            yield path, pathlib.Path(path.stem)
+
+
+def find_output_collisions(pdfs):
+    # Pairs of PDFs whose pages would go to the same directory, compared
+    # case-insensitively since that is how Windows and macOS see them
+    seen = {}
+    collisions = []
+    for pdf, out_name in pdfs:
+        key = str(out_name).casefold()
+        if key in seen:
+            collisions.append((seen[key], pdf, out_name))
+        else:
+            seen[key] = pdf
+    return collisions
+
+
+def load_manifest(path):
+    """Read rectangles from a JSON manifest.
+
+    Either a list of entries applied to every document, or an object
+    mapping PDF paths to such lists, relative paths are taken from the
+    manifest's directory. Entries are those understood by
+    pdfrect.parse_rect_entries; ones without a page go on every page.
+    Returns {pdf path or None: {page index or None: [rects]}}.
+    """
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    
+    if isinstance(manifest, list):
+        manifest = {None: manifest}
+    base_dir = os.path.dirname(os.path.abspath(path))
+    documents = {}
+    for pdf, entries in manifest.items():
+        pages = parse_rect_entries(entries, default_page=None)
+        key = os.path.abspath(os.path.join(base_dir, pdf)) if pdf is not None else None
+        documents[key] = {page: rects for page, (rects, labels) in pages.items()}
+    return documents
+
+
+def iter_tasks(pdfs, rects, manifest, output_dir, options):
+    # Generated lazily so the pool starts working before every PDF is opened
+    for pdf, out_name in pdfs:
+        try:
+            with fitz.open(pdf) as doc:
+                page_count = len(doc)
+        except Exception as e:
+            print(f"Skipping {pdf}: {e}", file=sys.stderr)
+            continue
+        
+        doc_rects = manifest.get(os.path.abspath(pdf), manifest.get(None, {}))
+        all_pages = list(rects) + doc_rects.get(None, [])
+        out_dir = output_dir / out_name
+        for page_index in range(page_count):
+            page_rects = all_pages + doc_rects.get(page_index, [])
+            out_path = out_dir / f"page_{page_index + 1:04d}.png"
+            yield str(pdf), page_index, page_rects, str(out_path), options
+
+
+def render_task(task):
+    # Runs in a pool worker: render, draw the overlay and write straight to disk
+    pdf, page_index, rects, out_path, options = task
+    start_time = time.perf_counter()
+    try:
+        page = open_worker_document(pdf)[page_index]
+        pix = page.get_pixmap(matrix=fitz.Matrix(options["zoom"], options["zoom"]), alpha=False)
+        image = draw_overlay(pixmap_to_image(pix), page.rect, rects, options["zoom"],
+                             options["color"], options["opacity"], options["border"])
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        image.save(out_path)
+    except Exception as e:
+        return pdf, page_index, time.perf_counter() - start_time, str(e)
+    return pdf, page_index, time.perf_counter() - start_time, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render PDF pages with rectangle overlays to PNG")
+    parser.add_argument("inputs", nargs="+", help="PDF files or directories to search for PDFs")
+    parser.add_argument("-o", "--output", default="overlays", help="Output directory (default: overlays)")
+    parser.add_argument("-r", "--rect", type=parse_rect, action="append", default=[],
+                        help="Rectangle x0,y0,x1,y1 drawn on every page, may be repeated")
+    parser.add_argument("-m", "--manifest", help="JSON manifest of rectangles")
+    parser.add_argument("--zoom", type=float, default=2.0)
+    parser.add_argument("--color", choices=list(COLOR_MAP), default="red")
+    parser.add_argument("--opacity", type=float, default=0.3)
+    parser.add_argument("--no-border", action="store_true", help="Don't draw the page border")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+    
+    manifest = load_manifest(args.manifest) if args.manifest else {}
+    options = {"zoom": args.zoom, "color": args.color, "opacity": args.opacity, "border": not args.no_border}
+    pdfs = list(find_pdfs(args.inputs))
+    collisions = find_output_collisions(pdfs)
+    if collisions:
+        for first, second, out_name in collisions:
+            print(f"{first} and {second} would both be written to {pathlib.Path(args.output) / out_name}",
+                  file=sys.stderr)
+        sys.exit(2)
+    # A misspelled manifest path would otherwise just get the default rectangles
+    found = {os.path.abspath(pdf) for pdf, out_name in pdfs}
+    for pdf in manifest:
+        if pdf is not None and pdf not in found:
+            print(f"Manifest entry {pdf} matches none of the inputs", file=sys.stderr)
+    tasks = iter_tasks(pdfs, args.rect, manifest, pathlib.Path(args.output), options)
+    
+    pages = failures = 0
+    render_seconds = 0.0
+    start_time = time.perf_counter()
+    with multiprocessing.Pool(args.workers) as pool:
+        for pdf, page_index, seconds, error in pool.imap_unordered(render_task, tasks, chunksize=4):
+            pages += 1
+            render_seconds += seconds
+            if error:
+                failures += 1
+                print(f"{pdf} page {page_index + 1}: {error}", file=sys.stderr)
+            if pages % 100 == 0:
+                elapsed = time.perf_counter() - start_time
+                print(f"{pages} pages, {pages / elapsed:.1f} pages/sec")
+    
+    elapsed = time.perf_counter() - start_time
+    print(f"Rendered {pages - failures} of {pages} pages in {elapsed:.1f}s "
+          f"({pages / elapsed if elapsed else 0:.1f} pages/sec, {args.workers} workers, "
+          f"{render_seconds / pages if pages else 0:.3f}s per page in workers)")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    main()